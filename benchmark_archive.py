@@ -0,0 +1,201 @@
+import os
+import sys
+import json
+import random
+import shutil
+import zipfile
+import multiprocessing
+from time import time
+from extract_models import ShapenetZipArchive, as_bytes
+from zip_index import ZipMemberIndex
+
+#
+# Benchmarks for the archive layer (extract_models / zip_index), on a synthetic shapenet-shaped zip
+#
+
+def make_obj (num_verts, rng):
+    """ returns the text of a (random) .obj file w/ num_verts verts + normals, and ~2 tris per vert """
+    lines = [ 'v %f %f %f'%(rng.uniform(-1, 1), rng.uniform(-1, 1), rng.uniform(-1, 1)) for i in range(num_verts) ]
+    lines += [ 'vn %f %f %f'%(rng.uniform(-1, 1), rng.uniform(-1, 1), rng.uniform(-1, 1)) for i in range(num_verts) ]
+    lines += [
+        'f %d//%d %d//%d %d//%d'%(a, a, b, b, c, c)
+        for a, b, c in (rng.sample(range(1, num_verts + 1), 3) for i in range(num_verts * 2))
+    ]
+    return '\n'.join(lines) + '\n'
+
+def build_synthetic_archive (path,
+        num_synsets = 4,
+        models_per_synset = 250,
+        verts_per_model = 1000,
+        textures_per_model = 2,
+        texture_size = 1 << 16,
+        seed = 1):
+    """ Writes a zip w/ the same layout as ShapeNetCore.v2.zip to path:
+        ShapeNetCore.v2/taxonomy.json
+        ShapeNetCore.v2/<synsetId>/<modelId>/models/model_normalized.{obj,mtl,json,solid.binvox,surface.binvox}
+        ShapeNetCore.v2/<synsetId>/<modelId>/images/texture<i>.jpg     (random bytes, stored uncompressed)
+
+    A few .obj files are generated + reused across models, to keep this fast.
+    """
+    print("Building synthetic archive '%s' (%s synsets x %s models)..."%(path, num_synsets, models_per_synset))
+    t0 = time()
+    rng = random.Random(seed)
+    root = os.path.split(path)[1][:-len('.zip')]
+    synsets = [ '%08d'%rng.randrange(10 ** 8) for i in range(num_synsets) ]
+    objs = [ make_obj(verts_per_model, rng).encode('utf-8') for i in range(4) ]
+    taxonomy = [
+        { 'synsetId': synset, 'name': 'synset%d,category%d'%(i, i), 'children': [], 'numInstances': models_per_synset }
+        for i, synset in enumerate(synsets)
+    ]
+
+    basedir = os.path.split(path)[0]
+    if basedir and not os.path.exists(basedir):
+        os.makedirs(basedir)
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(root + '/', b'')
+        archive.writestr(root + '/taxonomy.json', json.dumps(taxonomy))
+        for synset in synsets:
+            archive.writestr('%s/%s/'%(root, synset), b'')
+            for i in range(models_per_synset):
+                model_dir = '%s/%s/%032x'%(root, synset, rng.getrandbits(128))
+                archive.writestr(model_dir + '/', b'')
+                archive.writestr(model_dir + '/models/model_normalized.obj', objs[i % len(objs)])
+                archive.writestr(model_dir + '/models/model_normalized.mtl', b'newmtl material_0\nKd 0.5 0.5 0.5\n' * 8)
+                archive.writestr(model_dir + '/models/model_normalized.json', json.dumps({
+                    'id': model_dir, 'numVertices': verts_per_model, 'min': [ -1, -1, -1 ], 'max': [ 1, 1, 1 ] }))
+                archive.writestr(model_dir + '/models/model_normalized.solid.binvox', bytes(rng.getrandbits(8) for i in range(4096)))
+                archive.writestr(model_dir + '/models/model_normalized.surface.binvox', bytes(rng.getrandbits(8) for i in range(4096)))
+                for j in range(textures_per_model):
+                    archive.writestr(model_dir + '/images/texture%d.jpg'%j, os.urandom(texture_size),
+                        compress_type=zipfile.ZIP_STORED)
+    print("Built in %0.2fs (%s)"%(time() - t0, as_bytes(os.path.getsize(path))))
+    return synsets
+
+def drop_page_cache (*paths):
+    """ evicts files from the OS page cache (posix only). Returns False if that isn't supported """
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    for path in paths:
+        if os.path.exists(path):
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+    return True
+
+def reset_peak_rss ():
+    """ resets the peak RSS of this process (linux only). Returns False if that isn't supported """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def rss_status ():
+    """ returns (current RSS, peak RSS since the last reset_peak_rss()) of this process, in bytes """
+    with open('/proc/self/status') as f:
+        status = dict(line.split(':', 1) for line in f if ':' in line)
+    return int(status['VmRSS'].split()[0]) * 1024, int(status['VmHWM'].split()[0]) * 1024
+
+def read_and_close (file):
+    with file:
+        return file.read()
+
+def benchmark_archive (archive_path, work_dir, num_workers = None, modes = ('cold', 'warm')):
+    """ Times each archive operation + member read path on archive_path, w/ a cold (dropped) and warm
+    page cache. Returns a list of { 'name', 'cache', 'time', 'members', 'bytes', 'peak_memory' }, where peak_memory
+    is how far this process's RSS peaked above its RSS at the start of that operation (or None where peak RSS
+    can't be reset, ie. outside linux). It doesn't count extract_files' worker processes. """
+    index_path = archive_path + '.benchmark-index.sqlite'
+    extract_dir = os.path.join(work_dir, 'extracted')
+    results = []
+
+    def timed (name, cache, func, members = 0, size = 0):
+        if cache == 'cold' and not drop_page_cache(archive_path, index_path):
+            cache = 'cold (unsupported)'
+        measure_memory = reset_peak_rss()
+        start_rss = rss_status()[0] if measure_memory else None
+        t0 = time()
+        result = func()
+        elapsed = time() - t0
+        peak_memory = rss_status()[1] - start_rss if measure_memory else None
+        results.append({
+            'name': name, 'cache': cache, 'time': elapsed,
+            'members': members, 'bytes': size, 'peak_memory': peak_memory,
+        })
+        return result
+
+    with zipfile.ZipFile(archive_path, 'r') as archive:
+        infolist = archive.infolist()
+    files = [ info for info in infolist if not info.filename.endswith('/') ]
+    total_size = sum(info.file_size for info in files)
+    models = sorted(set('/'.join(info.filename.split('/')[1:3]) for info in files if info.filename.count('/') >= 3))
+    synsets = sorted(set(model.split('/')[0] for model in models))
+
+    for cache in modes:
+        shapenet_archive = ShapenetZipArchive(archive_path)
+        shapenet_archive.index = ZipMemberIndex(archive_path, index_path)
+        if os.path.exists(index_path):
+            os.remove(index_path)
+
+        timed('lazy_load', cache, shapenet_archive.lazy_load, len(infolist))
+        names = shapenet_archive.archive.namelist()
+        timed('build_file_index', cache, lambda: shapenet_archive.build_file_index(names), len(names))
+        timed('member index build', cache, lambda: shapenet_archive.index.build(infolist), len(infolist))
+        timed('get_extraction_task (per model)', cache,
+            lambda: [ shapenet_archive.get_extraction_task(model) for model in models ], len(models))
+
+        timed('read: ZipFile.open', cache,
+            lambda: [ read_and_close(shapenet_archive.archive.open(info.filename)) for info in files ], len(files), total_size)
+        timed('read: index open_member (stream)', cache,
+            lambda: [ read_and_close(shapenet_archive.index.open_member(info.filename)) for info in files ], len(files), total_size)
+        archive_files = [ info.filename[len(shapenet_archive.root_path) + 1:] for info in files
+            if info.filename.startswith(shapenet_archive.root_path + '/') ]
+        timed('read: ShapenetZipArchive.open', cache,
+            lambda: [ read_and_close(shapenet_archive.open(path)) for path in archive_files ], len(archive_files),
+            sum(info.file_size for info in files if info.filename.startswith(shapenet_archive.root_path + '/')))
+        rows = [ shapenet_archive.index.member(info.filename) for info in files ]
+        timed('read: mmap read (from index rows)', cache,
+            lambda: [ shapenet_archive.index.mapping.read(row) for row in rows ], len(files), total_size)
+
+        if os.path.exists(extract_dir):
+            shutil.rmtree(extract_dir)
+        timed('extract_files (%s workers)'%(num_workers or multiprocessing.cpu_count()), cache,
+            lambda: shapenet_archive.extract_files(synsets, extract_dir, num_workers), len(files), total_size)
+        shutil.rmtree(extract_dir)
+        shapenet_archive.close()
+
+    if os.path.exists(index_path):
+        os.remove(index_path)
+    return results
+
+def print_benchmark_results (results):
+    print("\n%-40s %-8s %10s %14s %12s %12s"%('operation', 'cache', 'time (s)', 'members / s', 'MB / s', 'peak MB'))
+    for result in results:
+        elapsed = max(result['time'], 1e-9)
+        print("%-40s %-8s %10.4f %14s %12s %12s"%(
+            result['name'], result['cache'], result['time'],
+            '%0.0f'%(result['members'] / elapsed) if result['members'] else '-',
+            '%0.1f'%(result['bytes'] / elapsed / 1e6) if result['bytes'] else '-',
+            '%0.1f'%(result['peak_memory'] / 1e6) if result['peak_memory'] is not None else '-'))
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: %s <work-dir> [<num-synsets> [<models-per-synset> [<verts-per-model> [<textures-per-model> [<num-workers>]]]]]"%sys.argv[0])
+        print("       %s --archive <existing-zip> <work-dir> [<num-workers>]"%sys.argv[0])
+        sys.exit()
+
+    if sys.argv[1] == '--archive':
+        archive_path, work_dir = sys.argv[2], sys.argv[3]
+        num_workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+    else:
+        work_dir = sys.argv[1]
+        config = [ int(arg) for arg in sys.argv[2:] ]
+        archive_path = os.path.join(work_dir, 'ShapeNetCore.v2.zip')
+        build_synthetic_archive(archive_path, *config[:4])
+        num_workers = config[4] if len(config) > 4 else None
+
+    print_benchmark_results(benchmark_archive(archive_path, work_dir, num_workers))
@@ -1,8 +1,16 @@
 import os
+import sys
+import zlib
+import heapq
+import queue
 import zipfile
 import json
+import sqlite3
+import multiprocessing
 from time import time
 from serialization_utils import serialize_object, deserialize_object
+from zip_index import ZipMemberIndex, ZipMemberReader, member_data_offset, MEMBER_KINDS
+from taxonomy_index import TaxonomyIndex, load_taxonomy_index
 
 #
 # Helper functions
@@ -101,6 +109,15 @@ assert_keyword_list_match('a,b', set([ 'a', 'c', 'd' ]), set(), True)
 assert_keyword_list_match('a,b', set([ 'a', 'b' ]), set([ 'a' ]), False)
 assert_keyword_list_match('a,b', set([ 'a', 'b' ]), set([ 'c' ]), True)
 
+
+def as_bytes (size):
+    """ formats a byte count, eg. 1536 => '1.50 KB' """
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024:
+            return "%0.2f %s"%(size, unit) if unit != 'B' else "%d B"%size
+        size /= 1024
+    return "%0.2f TB"%size
+
 #
 # Utility for reading files .zip or directory files...
 #
@@ -116,51 +133,156 @@ class ShapenetArchive:
         self.close()
 
 
+FILE_CACHE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS entries (
+        path        TEXT PRIMARY KEY,
+        source      TEXT,
+        size        INTEGER,
+        atime       REAL
+    );
+    CREATE INDEX IF NOT EXISTS entries_by_atime ON entries (atime);
+'''
+
 class FileCache ():
-    """ File cache layer for ShapenetZipArchive. Will only effectively store the .json file """
+    """ File cache layer for ShapenetZipArchive (mostly for taxonomy.json + repeated model reads).
+
+    Archive members are copied to cache_dir (at the same relative path) the first time they're opened.
+    Entries are tracked in a small sqlite index (<cache_dir>/.index.sqlite) w/ their size, last access
+    time + the archive they came from, and the least recently used entries are evicted once the cache
+    grows past max_bytes. Files are written to a temp file + renamed into place, and the index is
+    shared through sqlite locking, so several processes can use the same cache dir.
+    """
 
-    def __init__ (self, archive, cache_dir = './.cached_files'):
+    def __init__ (self, archive, cache_dir = './.cached_files', max_bytes = 1 << 30):
         print("Loading file cache...")
         self.archive = archive
         self.cache_dir = cache_dir
-        self.file_cache = {}
-        if os.path.exists(cache_dir):
-            for root, dirs, files in os.walk(cache_dir):
-                for file in files:
-                    path = os.path.join(*(dirs + [ file ]))
-                    cache_dir = os.path.join(root, path)
-                    self.file_cache[path] = cache_dir
-
-        for path, cache_path in self.file_cache.items():
-            print("   cache '%s' => '%s'"%(path, cache_path))
+        self.index_path = os.path.join(cache_dir, '.index.sqlite')
+        self.max_bytes = max_bytes
+        self.db, self.db_pid = None, None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        adopt_files = not os.path.exists(self.index_path)
+        os.makedirs(cache_dir, exist_ok=True)
+        if adopt_files:
+            self.adopt_cached_files()
+        for path, size in self.connect().execute('SELECT path, size FROM entries ORDER BY path'):
+            print("   cache '%s' => '%s' (%s)"%(path, self.cached_path(path), as_bytes(size)))
+
+    def connect (self):
+        # sqlite connections can't be shared w/ forked processes: reconnect in each one
+        if self.db is None or self.db_pid != os.getpid():
+            self.db = sqlite3.connect(self.index_path, timeout=60, isolation_level=None)
+            self.db.executescript(FILE_CACHE_SCHEMA)
+            self.db_pid = os.getpid()
+        return self.db
+
+    def source (self):
+        """ identifies the archive entries were read from, so entries from another archive are misses """
+        stat = os.stat(self.archive.path)
+        return '%s:%s:%s'%(os.path.abspath(self.archive.path), stat.st_size, stat.st_mtime_ns)
+
+    def cached_path (self, path):
+        return member_target_path(self.cache_dir, path)
+
+    def adopt_cached_files (self):
+        """ indexes files already in cache_dir (ie. from a cache w/out an index) """
+        db, source, now = self.connect(), self.source(), time()
+        for root, dirs, files in os.walk(self.cache_dir):
+            for file in files:
+                cached_path = os.path.join(root, file)
+                path = os.path.relpath(cached_path, self.cache_dir).replace(os.sep, '/')
+                if path.startswith('.') or file.endswith('.partial'):
+                    continue
+                db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)',
+                    (path, source, os.path.getsize(cached_path), now))
 
     def open (self, path, *args, **kwargs):
+        """ opens a (cached) archive member; takes the same args as open() """
+        db, cached_path = self.connect(), self.cached_path(path)
+        entry = db.execute('SELECT source FROM entries WHERE path = ?', (path,)).fetchone()
+        if entry and entry[0] == self.source():
+            try:
+                f = open(cached_path, *args, **kwargs)
+            except FileNotFoundError:
+                pass
+            else:
+                db.execute('UPDATE entries SET atime = ? WHERE path = ?', (time(), path))
+                self.hits += 1
+                return f
+
         # If file not in cache, read it from archive and write it to file cache
-        if path not in self.file_cache:
-            cached_path = os.path.join(self.cache_dir, path)
-            self.file_cache[path] = cached_path
-
-            with self.archive.open(path, 'r') as input_file:
-
-                # Make directories
-                path_dirs = os.path.split(cached_path)[0]
-                if not os.path.exists(path_dirs):
-                    os.makedirs(path_dirs)
-
-                # Write file
-                print("Writing '%s' to cache (at '%s')"%(path, cached_path))
-                data = input_file.read()
-                try:
-                    with open(cached_path, 'w') as f:
-                        f.write(data)
-                except TypeError:
-                    with open(cached_path, 'wb') as f:
-                        f.write(data)
-
-        # Read cached file from disk
-        return open(self.file_cache[path], *args, **kwargs)
+        self.misses += 1
+        print("Writing '%s' to cache (at '%s')"%(path, cached_path))
+        os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+        temp_path = '%s.%s.partial'%(cached_path, os.getpid())
+        with self.archive.open(path, 'rb') as input_file, open(temp_path, 'wb') as f:
+            size = 0
+            for chunk in iter(lambda: input_file.read(1 << 20), b''):
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(temp_path, cached_path)
+
+        # open before evicting, so the file stays readable even if it's evicted right away
+        f = open(cached_path, *args, **kwargs)
+        db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)', (path, self.source(), size, time()))
+        self.evict()
+        return f
+
+    def total_bytes (self):
+        return self.connect().execute('SELECT SUM(size) FROM entries').fetchone()[0] or 0
+
+    def evict (self):
+        """ removes least recently used entries until the cache fits in max_bytes """
+        db = self.connect()
+        total_bytes = self.total_bytes()
+        if total_bytes <= self.max_bytes:
+            return
+        evicted = []
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            for path, size in db.execute('SELECT path, size FROM entries ORDER BY atime').fetchall():
+                if total_bytes <= self.max_bytes:
+                    break
+                db.execute('DELETE FROM entries WHERE path = ?', (path,))
+                evicted.append(path)
+                total_bytes -= size
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        for path in evicted:
+            try:
+                os.remove(self.cached_path(path))
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+
+    def clear (self):
+        db = self.connect()
+        for (path,) in db.execute('SELECT path FROM entries').fetchall():
+            try:
+                os.remove(self.cached_path(path))
+            except FileNotFoundError:
+                pass
+        db.execute('DELETE FROM entries')
+
+    def stats (self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'bytes': self.total_bytes(),
+        }
 
     def close (self):
+        if self.db is not None and self.db_pid == os.getpid():
+            self.db.close()
+        self.db = None
         self.archive.close()
 
     # Forward __enter__ / __exit__ to archive
@@ -170,7 +292,7 @@ class FileCache ():
         return self
 
     def __exit__ (self, *args):
-        self.archive.__exit__(*args)
+        self.close()
 
     def __getattr__ (self, attr):
         return self.archive.__getattribute__(attr)
@@ -186,35 +308,50 @@ class ShapenetZipArchive (ShapenetArchive):
         self.models = None
         # self.file_index = None
         self.cache_dir = './.cached-files'
+        self.root_path = os.path.split(self.path)[1][:-len('.zip')]
+        self.index = ZipMemberIndex(self.path)
+        # the index is validated (see load_member_index) once per archive instance, and member rows
+        # are cached as they're looked up, so repeated opens / exists checks are dict hits
+        self.checked_index = None
+        self.member_rows = {}
 
     def lazy_load (self):
         if not self.archive:
             print("Loading '%s'..."%self.path)
             t0 = time()
-            self.root_path = os.path.split(self.path)[1].strip('.zip')
             self.archive   = zipfile.ZipFile(self.path, 'r')
             print("Loaded in %s"%(time() - t0))
 
-    def load_file_index (self):
-        SYNSETS_PATH = 'synsets.json.zip'
-        MODELS_PATH  = 'models.json.zip'
+    def load_member_index (self):
+        """ returns the archive's persistent member index (see zip_index.ZipMemberIndex),
+        building it from the central directory if it's missing or out of date.
+        Only checked on first use (or if self.index is replaced) """
+        if self.checked_index is not self.index:
+            if not self.index.is_current():
+                self.lazy_load()
+                self.index.build(self.archive.infolist())
+            self.checked_index = self.index
+            self.member_rows = {}
+        return self.index
+
+    def member_row (self, path):
+        """ returns the (cached) index row for a resolved member path, or None """
+        index = self.load_member_index()
+        if path not in self.member_rows:
+            self.member_rows[path] = index.member(path)
+        return self.member_rows[path]
+
+    def signature (self):
+        """ identifies the current version of the archive (see taxonomy_index.load_taxonomy_index) """
+        return self.index.archive_signature()
+
+    def synset_totals (self):
+        """ returns { synsetId: [ # models, compressed bytes, extracted bytes ] } """
+        return self.load_member_index().synset_totals()
 
-        # if not self.file_index:
+    def load_file_index (self):
         if not self.synsets:
-            try:
-                self.synsets, self.models = deserialize_object(SYNSETS_PATH), deserialize_object(MODELS_PATH)
-                # self.file_index = deserialize_object('file_index')
-                return
-            except FileNotFoundError:
-                pass
-            except json.decoder.JSONDecodeError:
-                pass
-            self.lazy_load()
-            self.synsets, self.models = self.build_file_index(self.archive.namelist())
-            # self.file_index = self.build_file_index(self.archive.namelist())
-            # serialize_object('file_index', self.file_index)
-            serialize_object(SYNSETS_PATH, self.synsets)
-            serialize_object(MODELS_PATH, self.models)
+            self.synsets, self.models = self.load_member_index().load_synsets_and_models()
 
     def build_file_index (self, files):
         print("Building file index...")
@@ -280,104 +417,286 @@ class ShapenetZipArchive (ShapenetArchive):
         return synsets, models
         # return files_by_first_subdir_prefix
 
-    def get_files_to_extract (self, paths):
-        self.load_file_index()
-        missing_files = [
-            path for path in paths
-            if path not in self.synsets
-        ]
+    def get_files_to_extract (self, paths, kinds = None):
+        """ returns { synsetId: [ member paths ] } for a list of synsetIds, optionally restricted to a
+        set of member kinds (see zip_index.MEMBER_KINDS, eg. [ 'obj', 'solid.binvox' ]) """
+        index = self.load_member_index()
+        files = {
+            path: [ member['path'] for member in index.members(synset=path, kinds=kinds) ]
+            for path in paths
+        }
+        missing_files = [ path for path, members in files.items() if not members ]
         if missing_files:
             print("Warning: archive is incomplete, missing %s / %s synset subdirectories: %s"%(
                 len(missing_files), len(paths), missing_files))
-        return {}
-        # return {
-        #     path: self.file_index[path]
-        #     for path in paths
-        #     if path in self.file_index
-        # }
-
-    def extract_files (self, paths, target_dir):
-        files = self.get_files_to_extract(paths)
-        self.lazy_load()
+        return { path: members for path, members in files.items() if members }
+
+    def extract_files (self, paths, target_dir, num_workers = None, kinds = None):
+        """ extracts every file (or every file of the given member kinds) in a list of synsets
+        to target_dir, across num_workers processes """
+        files = self.get_files_to_extract(paths, kinds)
         for synset, paths in files.items():
             print("Extracting synset '%s' (%s files...)"%(synset, len(paths)))
-            files_extracted = 0
-            for path in paths:
-                # print("Extracting %s"%path)
-                self.archive.extract(path, target_dir)
-                files_extracted += 1
-                if files_extracted % 500 == 0:
-                    print("%s / %s: %d%%"%(
-                        files_extracted, len(paths),
-                        int(files_extracted / len(paths) * 100)))
+        index = self.load_member_index()
+        members = [ index.member(path) for paths in files.values() for path in paths ]
+        if kinds is not None:
+            full_size = sum(member['file_size'] for synset in files for member in index.members(synset=synset))
+            print("Extracting %s only: skipping %s"%(
+                ', '.join(sorted(kinds)), as_bytes(full_size - sum(member['file_size'] for member in members))))
+        return extract_members(self.path, members, target_dir, num_workers)
 
     def resolve_path (self, path):
         return os.path.join(self.root_path, path)
 
     def open (self, path, *args, **kwargs):
-        self.lazy_load()
-        return self.archive.open(self.resolve_path(path), *args, **kwargs)
+        """ opens a member for reading (as a binary stream), directly from its offset in the archive """
+        member = self.member_row(self.resolve_path(path))
+        if member is None:
+            raise KeyError("There is no item named '%s' in the archive"%self.resolve_path(path))
+        return self.index.mapping.open(member)
 
     def exists (self, path):
-        self.lazy_load()
-        try:
-            self.archive.getinfo()
-            return True
-        except KeyError:
-            return False
+        return self.member_row(self.resolve_path(path)) is not None
 
     def extract_paths (self, paths, target_dir):
         self.lazy_load()
 
-    def get_extraction_task (self, path):
-        self.lazy_load()
-        extract_task = {
+    def get_extraction_task (self, path, kinds = None):
+        """ builds an extraction task for every file under path, optionally restricted to a set of
+        member kinds (see zip_index.MEMBER_KINDS); full_*_size is the size of the unrestricted task.
+        Resolved w/ range queries on the member index, so this doesn't scan the archive """
+        index = self.load_member_index()
+        print("Building extraction task for '%s'"%path)
+        prefix = self.resolve_path(path)
+        members = index.members_with_prefix(prefix, kinds)
+        num_files, full_compressed_size, full_extracted_size = index.prefix_totals(prefix)
+        return {
             'name': path,
-            'paths': [],
-            'extracted_size': 0,
-            'compressed_size': 0,
-            'num_files': 0
+            'kinds': sorted(kinds) if kinds is not None else None,
+            'paths': [ member['path'] for member in members ],
+            'extracted_size': sum(member['file_size'] for member in members),
+            'compressed_size': sum(member['compress_size'] for member in members),
+            'num_files': len(members),
+            'full_extracted_size': full_extracted_size,
+            'full_compressed_size': full_compressed_size,
         }
-        print("Building extraction task for '%s'"%path)
-        path = self.resolve_path(path)
-        for file in self.archive.namelist():
-            if file.startswith(path):
-                info = self.archive.getinfo(file)
-                extract_task['paths'].append(file)
-                extract_task['extracted_size'] += info.file_size
-                extract_task['compressed_size'] += info.compress_size
-                extract_task['num_files'] += 1
-        return extract_task
-
-    def do_extraction (self, target_dir, extract_task):
-        self.lazy_load()
+
+    def do_extraction (self, target_dir, extract_task, num_workers = None):
         print("Extracting '%s' (%s files, %s compressed, %s extracted)"%(
             extract_task['name'], 
             extract_task['num_files'],
             as_bytes(extract_task['compressed_size']),
             as_bytes(extract_task['extracted_size'])
         ))
-        for path in extract_task['paths']:
-            self.archive.extract(path, target_dir)
-
-    def extract (self, path, target_dir):
+        if extract_task.get('kinds') is not None:
+            print("Extracting %s only: skipping %s compressed, %s extracted"%(
+                ', '.join(extract_task['kinds']),
+                as_bytes(extract_task['full_compressed_size'] - extract_task['compressed_size']),
+                as_bytes(extract_task['full_extracted_size'] - extract_task['extracted_size'])))
+        index = self.load_member_index()
+        members = [ index.member(path) for path in extract_task['paths'] ]
+        return extract_members(self.path, members, target_dir, num_workers)
+
+    def extract (self, path, target_dir, kinds = None, num_workers = 1):
         print("Extracting '%s'"%path)
-        self.lazy_load()
-        path = self.resolve_path(path)
-        for file in self.archive.namelist():
-            if file.startswith(path):
-                info = self.archive.getinfo(file)
-                print("Extracting '%s' (compressed %s => extracted %s)"%(
-                    path, info.compress_size, info.file_size))
-                self.archive.extract(file, target_dir)
+        members = self.load_member_index().members_with_prefix(self.resolve_path(path), kinds)
+        return extract_members(self.path, members, target_dir, num_workers)
 
     def close (self):
+        self.index.close()
+        self.checked_index = None
+        self.member_rows = {}
         if self.archive:
             print("Closing '%s'"%self.path)
             self.archive.close()
             self.archive = None
 
 
+#
+# Parallel extraction
+#
+
+def member_target_path (target_dir, path):
+    """ returns target_dir/<path> for an archive member path, raising on paths that would escape target_dir
+    (absolute paths, drive letters, '..' components: see zip slip) """
+    parts = path.replace('\\', '/').split('/')
+    if path.startswith(('/', '\\')) or os.path.splitdrive(path)[0] or ':' in parts[0] or '..' in parts:
+        raise Exception("Unsafe archive member path '%s'"%path)
+    target_dir = os.path.abspath(target_dir)
+    target_path = os.path.join(target_dir, *[ part for part in parts if part not in ('', '.') ])
+    if os.path.commonpath([ os.path.realpath(target_dir), os.path.realpath(target_path) ]) != os.path.realpath(target_dir):
+        raise Exception("Archive member path '%s' escapes '%s'"%(path, target_dir))
+    return target_path
+
+def check_member_paths ():
+    """ checks that archive members w/ paths outside the target dir are rejected, both by member_target_path
+    and by extract_members on an archive w/ a malicious member name (prints + returns False if not) """
+    import tempfile
+    ok = True
+    for path in [ 'a/b/c.obj', 'a/./b/', 'a//b' ]:
+        try:
+            member_target_path('extracted', path)
+        except Exception as e:
+            print("FAILED: rejected '%s' (%s)"%(path, e))
+            ok = False
+    for path in [ 'slip/../../slip_escaped.txt', '../x', '/etc/passwd', '\\\\server\\share\\x', 'C:/x', 'c:x', 'a\\..\\..\\x' ]:
+        try:
+            print("FAILED: accepted '%s' (=> '%s')"%(path, member_target_path('extracted', path)))
+            ok = False
+        except Exception:
+            pass
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        archive_path = os.path.join(work_dir, 'slip.zip')
+        target_dir = os.path.join(work_dir, 'a', 'b')
+        with zipfile.ZipFile(archive_path, 'w') as archive:
+            archive.writestr('models/ok.txt', b'ok')
+            archive.writestr('slip/../../slip_escaped.txt', b'escaped')
+        index = ZipMemberIndex(archive_path)
+        index.build()
+        errors = extract_members(archive_path, index.members(), target_dir, num_workers=1)
+        index.close()
+        if errors != 1 or not os.path.exists(os.path.join(target_dir, 'models', 'ok.txt')):
+            print("FAILED: expected 1 error + models/ok.txt to be extracted (got %s errors)"%errors)
+            ok = False
+        if os.path.exists(os.path.join(work_dir, 'a', 'slip_escaped.txt')):
+            print("FAILED: 'slip/../../slip_escaped.txt' was extracted outside of the target dir")
+            ok = False
+    print("OK" if ok else "FAILED")
+    return ok
+
+def balance_by_size (members, num_bins, key = 'compress_size', keep_empty = False):
+    """ splits members into num_bins lists w/ ~equal total member[key] (largest first, onto the smallest bin).
+    Empty bins are dropped, unless keep_empty """
+    bins = [ (0, i, []) for i in range(num_bins) ]
+    for member in sorted(members, key=lambda member: -member[key]):
+        total, i, items = heapq.heappop(bins)
+        items.append(member)
+        heapq.heappush(bins, (total + member[key], i, items))
+    return [ items for total, i, items in sorted(bins, key=lambda item: item[1]) if items or keep_empty ]
+
+def extract_member (f, member, target_dir):
+    """ extracts one member (an index row) from an open archive file to target_dir/<member path>.
+    Writes to a temp file + renames it into place, and checks the crc. """
+    target_path = member_target_path(target_dir, member['path'])
+    if member['path'].endswith('/'):
+        os.makedirs(target_path, exist_ok=True)
+        return
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+
+    temp_path = '%s.%s.partial'%(target_path, os.getpid())
+    reader = ZipMemberReader(f, member_data_offset(f, member['header_offset']), member, close_file=False)
+    crc = 0
+    with open(temp_path, 'wb') as output:
+        for chunk in iter(lambda: reader.read(1 << 20), b''):
+            crc = zlib.crc32(chunk, crc)
+            output.write(chunk)
+    if crc != member['crc']:
+        os.remove(temp_path)
+        raise Exception("Bad crc for '%s'"%member['path'])
+    os.replace(temp_path, target_path)
+
+def is_extracted (member, target_dir):
+    """ true iff a member has already been extracted to target_dir (w/ the right size) """
+    target_path = member_target_path(target_dir, member['path'])
+    if member['path'].endswith('/'):
+        return os.path.isdir(target_path)
+    try:
+        return os.path.getsize(target_path) == member['file_size']
+    except OSError:
+        return False
+
+def extract_members_worker (archive_path, members, target_dir, progress, report_interval = 0.25):
+    """ extracts a list of members w/ its own read-only archive handle, reporting
+    ('progress', files, bytes, skipped files, skipped bytes) + ('error', path, message) to progress
+    (a queue), and ('done',) once finished """
+    files = size = skipped_files = skipped_size = 0
+    last_report = time()
+    with open(archive_path, 'rb') as f:
+        for member in members:
+            try:
+                if is_extracted(member, target_dir):
+                    skipped_files += 1
+                    skipped_size += member['file_size']
+                else:
+                    extract_member(f, member, target_dir)
+                    files += 1
+                    size += member['file_size']
+            except Exception as e:
+                progress.put(('error', member['path'], str(e)))
+
+            if time() - last_report >= report_interval:
+                last_report = time()
+                progress.put(('progress', files, size, skipped_files, skipped_size))
+                files = size = skipped_files = skipped_size = 0
+    progress.put(('progress', files, size, skipped_files, skipped_size))
+    progress.put(('done',))
+
+def extract_members (archive_path, members, target_dir, num_workers = None, progress_interval = 1.0):
+    """ Extracts members (zip index rows, see zip_index.ZipMemberIndex) of archive_path to target_dir,
+    across num_workers processes (each w/ its own archive handle + a set of members balanced by
+    compressed size). Resumable: members that already exist w/ the right size are skipped.
+
+    Returns the # of errors.
+    """
+    members = [ dict(member) for member in members ]
+    num_workers = max(1, min(num_workers or multiprocessing.cpu_count(), len(members)))
+    total_files = len(members)
+    total_size = sum(member['file_size'] for member in members)
+    print("Extracting %s files (%s) to '%s' w/ %s workers"%(
+        total_files, as_bytes(total_size), target_dir, num_workers))
+
+    bundles = balance_by_size(members, num_workers)
+    if num_workers > 1:
+        progress = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(target=extract_members_worker, args=(archive_path, bundle, target_dir, progress))
+            for bundle in bundles
+        ]
+        for worker in workers:
+            worker.start()
+    else:
+        progress, workers = queue.Queue(), []
+        for bundle in bundles:
+            extract_members_worker(archive_path, bundle, target_dir, progress)
+
+    t0 = last_progress = time()
+    files = size = skipped_files = skipped_size = errors = 0
+    running = len(bundles)
+    while running:
+        try:
+            message = progress.get(timeout=progress_interval)
+        except queue.Empty:
+            if workers and not any(worker.is_alive() for worker in workers):
+                print("Error: extraction workers exited unexpectedly")
+                errors += 1
+                break
+            message = None
+
+        if message and message[0] == 'done':
+            running -= 1
+        elif message and message[0] == 'error':
+            errors += 1
+            print("Failed to extract '%s': %s"%(message[1], message[2]))
+        elif message:
+            files += message[1]
+            size += message[2]
+            skipped_files += message[3]
+            skipped_size += message[4]
+
+        if time() - last_progress >= progress_interval or not running:
+            last_progress = time()
+            done_size = size + skipped_size
+            print("%s / %s files, %s / %s (%d%%), %s / s%s"%(
+                files + skipped_files, total_files, as_bytes(done_size), as_bytes(total_size),
+                int(done_size / max(total_size, 1) * 100), as_bytes(size / max(last_progress - t0, 1e-9)),
+                ", %s already extracted"%skipped_files if skipped_files else ''))
+
+    for worker in workers:
+        worker.join()
+    return errors
+
+
 class ShapenetDirArchive (ShapenetArchive):
     """ Encapsulates a plain unzipped directory w/ the same interface as ShapenetZipArchive """
 
@@ -399,9 +718,27 @@ class ShapenetDirArchive (ShapenetArchive):
     def listdir (self, path):
         return os.listdir(self.resolve_path(path))
 
-    def extract (self, path, target_dir):
+    def extract (self, path, target_dir, kinds = None):
         pass
 
+    def signature (self):
+        """ identifies the current version of the archive (see taxonomy_index.load_taxonomy_index) """
+        synsets = [ path for path in self.listdir('.') if os.path.isdir(self.resolve_path(path)) ]
+        return { 'mtime': str(max([ os.stat(self.resolve_path(path)).st_mtime_ns for path in synsets + [ '.' ] ])) }
+
+    def synset_totals (self):
+        """ returns { synsetId: [ # models, compressed bytes, extracted bytes ] } (compressed = extracted) """
+        totals = {}
+        for synset in self.listdir('.'):
+            if not os.path.isdir(self.resolve_path(synset)):
+                continue
+            models = [ model for model in self.listdir(synset) if os.path.isdir(self.resolve_path(os.path.join(synset, model))) ]
+            size = 0
+            for root, dirs, files in os.walk(self.resolve_path(synset)):
+                size += sum(os.path.getsize(os.path.join(root, file)) for file in files)
+            totals[synset] = [ len(models), size, size ]
+        return totals
+
 
 def load_shapenet_archive (path):
     """ Loads a shapenet archive (either .zip or plain root directory), encapsulating
@@ -418,60 +755,52 @@ def load_shapenet_archive (path):
 
 def get_matching_shapenet_model_ids (shapenet_archive, matching_keywords, non_matching_keywords=None):
     """ finds + returns matching synsetIds from matching shapenet
-    taxonomy groups in <shapnet_zip_archive>/taxonomy.json """
-
-    matching_keywords = set(matching_keywords or [])
-    non_matching_keywords = set(non_matching_keywords or [])
-
-    taxonomy_path = 'taxonomy.json'
-    with shapenet_archive.open(taxonomy_path, 'r') as f:
-        data = json.loads(f.read())
-
-    items_by_synset = {
-        item['synsetId']: item
-        for item in data
-    }
-
-    matching_synsets = {}
-    indent = 0
-
-    def add_synset (synsetId):
-        nonlocal indent
-        indent += 1
-        item = items_by_synset[synsetId]
-        if synsetId not in matching_synsets and keyword_list_match(item['name'], set(), non_matching_keywords):
-            matching_synsets[synsetId] = item
-            for child in item['children']:
-                if child in matching_synsets:
-                    continue
-
-                # print("%s => child %s => %s"%(
-                #     '\t' * indent,
-                #     synsetId, items_by_synset[synsetId]['name']))
-                add_synset(child)
+    taxonomy groups in <shapnet_zip_archive>/taxonomy.json (see taxonomy_index.TaxonomyIndex.query) """
 
     print("Querying all models matching %s and not %s"%(
-        matching_keywords or '<none>', non_matching_keywords or '<none>'))
-    for item in data:
-        if keyword_list_match(item['name'], matching_keywords, non_matching_keywords):
-            # print("matched %s => %s"%(item['synsetId'], item['name']))
-            indent = 0
-            add_synset(item['synsetId'])
-
-    for synsetId, item in matching_synsets.items():
-        print('%s => %s'%(synsetId, item['name']))
-    return matching_synsets.keys()
-    # print(matching_synsets)
+        set(matching_keywords or []) or '<none>', set(non_matching_keywords or []) or '<none>'))
+    taxonomy = load_taxonomy_index(shapenet_archive)
+    result = taxonomy.query(matching_keywords, non_matching_keywords)
+    for synsetId in result['synsets']:
+        print('%s => %s'%(synsetId, taxonomy.names[synsetId]))
+    print("Matched %s synsets, %s models (%s compressed, %s extracted)"%(
+        len(result['synsets']), result['num_models'],
+        as_bytes(result['compressed_size']), as_bytes(result['extracted_size'])))
+    return result['synsets']
+
+# sanity checks: TaxonomyIndex queries should match the (recursive) keyword_list_match semantics
+_taxonomy = TaxonomyIndex.from_taxonomy([
+    { 'synsetId': 'car',   'name': 'car,auto',  'children': [ 'jeep', 'cab' ] },
+    { 'synsetId': 'jeep',  'name': 'jeep',      'children': [ 'wagon' ] },
+    { 'synsetId': 'cab',   'name': 'cab,taxi',  'children': [] },
+    { 'synsetId': 'wagon', 'name': 'wagon',     'children': [] },
+    { 'synsetId': 'plane', 'name': 'airplane',  'children': [] },
+    { 'synsetId': 'blank', 'name': '',          'children': [] },
+])
+assert_eq(_taxonomy.query([ 'auto' ])['synsets'], [ 'cab', 'car', 'jeep', 'wagon' ])
+assert_eq(_taxonomy.query([ 'car' ], [ 'jeep' ])['synsets'], [ 'cab', 'car' ])
+assert_eq(_taxonomy.query([ 'car', 'wagon' ], [ 'jeep' ])['synsets'], [ 'cab', 'car', 'wagon' ])
+assert_eq(_taxonomy.query([], [ 'car' ])['synsets'], [ 'cab', 'jeep', 'plane', 'wagon' ])
+assert_eq(_taxonomy.query([ 'boat' ])['synsets'], [])
 
 #
 # Extract files...
 #
 
-def extract_models (shapenet_archive, output_dir, *args, **kwargs):
+def extract_models (shapenet_archive, output_dir, *args, num_workers = None, kinds = None, **kwargs):
+    """ extracts all models matching a keyword query (see get_matching_shapenet_model_ids);
+    set kinds to only extract some member kinds, eg. kinds = [ 'obj' ] """
+    if kinds is not None:
+        unknown_kinds = set(kinds) - set(MEMBER_KINDS)
+        if unknown_kinds:
+            raise Exception("Unknown member kinds %s (expected one of %s)"%(sorted(unknown_kinds), MEMBER_KINDS))
     synset_dirs = get_matching_shapenet_model_ids(shapenet_archive, *args, **kwargs)
-    shapenet_archive.extract_files(synset_dirs, output_dir)
+    shapenet_archive.extract_files(synset_dirs, output_dir, num_workers = num_workers, kinds = kinds)
 
 if __name__ == '__main__':
+    if sys.argv[1:] == [ '--check-member-paths' ]:
+        sys.exit(0 if check_member_paths() else 1)
+
     # extract_models()
 
     shapenet_path = './ShapeNetCore.v2.zip'
@@ -1,32 +1,99 @@
 import sys
 import os
 import multiprocessing
-from serialization_utils import serialize_object, deserialize_object
+import numpy as np
+from time import time
+from serialization_utils import serialize_object, deserialize_object, file_format
 
-def load_json_files (directory, num_processes = 8, file_ext = '.json'):
+def load_param_row (task):
+    """ load_json_files worker: decodes one params file straight into a float32 array """
+    index, path = task
+    try:
+        return index, np.asarray(deserialize_object(path, verbose=False), dtype=np.float32).ravel(), None
+    except Exception as e:
+        return index, None, str(e)
+
+def load_json_files (directory, num_processes = 8, file_ext = '.json', chunksize = 64, progress_interval = 1.0):
+    """ Loads a directory of params files (eg. per-model json files) into one dataset.
+
+    Files are decoded in worker processes, streamed back (imap_unordered), and copied into
+    one preallocated N x D float32 matrix, so the parent only ever holds ~1 copy of the dataset.
+    D is the most common row size (ties go to the first file, in path order); files w/ other sizes
+    are reported + skipped, regardless of which file finishes loading first.
+
+    Returns { path: params } where each params row is a view into that matrix.
+    """
     print("Scanning '%s'"%directory)
-    files = [
+    files = sorted(
         os.path.join(dirpath, file)
         for dirpath, subdirs, files in os.walk(directory)
         for file in files
         if file.endswith(file_ext)
-    ]
+    )
     print("Found %s files"%len(files))
     print("Loading files...")
 
     pool = multiprocessing.Pool(num_processes)
 
-    dataset = {}
-    i = 0
-    for path, data in zip(files, pool.map(deserialize_object, files)):
-        dataset[path] = data
-        print("%d / %d: loaded '%s'"%(i, len(files), path))
-        i += 1
-    return dataset
+    t0 = time()
+    last_progress = t0
+    # rows go into a matrix sized by the first row to arrive; rows w/ other sizes are held on to
+    # until every size is known (this only costs extra memory if files disagree on their size)
+    values, loaded, other_rows = None, np.zeros(len(files), dtype=bool), {}
+    failed = 0
+    try:
+        for i, (index, row, error) in enumerate(pool.imap_unordered(
+                load_param_row, enumerate(files), chunksize)):
+            if error:
+                print("Failed to load '%s': %s"%(files[index], error))
+                failed += 1
+            else:
+                if values is None:
+                    values = np.empty((len(files), row.size), dtype=np.float32)
+                if row.size == values.shape[1]:
+                    values[index] = row
+                    loaded[index] = True
+                else:
+                    other_rows.setdefault(row.size, {})[index] = row
+
+            if time() - last_progress >= progress_interval or i + 1 == len(files):
+                last_progress = time()
+                print("%d / %d read, %d failed (%0.1f files / sec)"%(
+                    i + 1, len(files), failed, (i + 1) / max(last_progress - t0, 1e-9)))
+    finally:
+        pool.close()
+        pool.join()
+
+    if other_rows:
+        rows_by_size = dict(other_rows)
+        rows_by_size[values.shape[1]] = { index: values[index] for index in np.flatnonzero(loaded) }
+        size = min(rows_by_size, key=lambda size: (-len(rows_by_size[size]), min(rows_by_size[size])))
+        print("Files have %s different sizes: keeping the %s rows w/ %s values"%(
+            len(rows_by_size), len(rows_by_size[size]), size))
+        if size != values.shape[1]:
+            values, loaded = np.empty((len(files), size), dtype=np.float32), np.zeros(len(files), dtype=bool)
+            for index, row in rows_by_size[size].items():
+                values[index] = row
+                loaded[index] = True
+        rejected = sorted(
+            (index, other_size) for other_size, rows in rows_by_size.items() if other_size != size for index in rows)
+        for index, other_size in rejected:
+            print("Failed to load '%s': %s values, expected %s"%(files[index], other_size, size))
+        rows_by_size = other_rows = None
+
+    print("%d / %d loaded (%0.1f files / sec)"%(
+        np.count_nonzero(loaded), len(files), len(files) / max(time() - t0, 1e-9)))
+    return {
+        path: values[i]
+        for i, path in enumerate(files)
+        if loaded[i]
+    }
 
 if __name__ == '__main__':
     if len(sys.argv) < 3:
         print("usage: %s <import-path> <export-file>"%(sys.argv[0]))
     else:
         dataset = load_json_files(sys.argv[1])
+        if file_format(sys.argv[2]) == 'json':
+            dataset = { path: params.tolist() for path, params in dataset.items() }
         serialize_object(sys.argv[2], dataset)
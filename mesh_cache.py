@@ -0,0 +1,165 @@
+import os
+import json
+import struct
+import hashlib
+import numpy as np
+
+#
+# Sidecar file format: a parsed mesh (see read_obj.read_obj_arrays) as one binary file
+#
+#   header size     u64
+#   header          json: { 'fields': scalar data fields, 'errors': [...], 'arrays': { name: [ dtype, shape, offset ] } }
+#   arrays          raw array data, each aligned to SIDECAR_ALIGNMENT
+#
+
+SIDECAR_ALIGNMENT = 64
+SIDECAR_EXT = '.mesh'
+
+def align (offset, alignment = SIDECAR_ALIGNMENT):
+    return (offset + alignment - 1) // alignment * alignment
+
+def write_sidecar (path, data, errors):
+    """ writes a parsed mesh (data, errors) to path, atomically (temp file + rename) """
+    arrays = { key: np.ascontiguousarray(value) for key, value in data.items() if isinstance(value, np.ndarray) }
+    fields = { key: value for key, value in data.items() if key not in arrays }
+
+    layout, offset = {}, 0
+    for key, array in arrays.items():
+        offset = align(offset)
+        layout[key] = [ array.dtype.str, list(array.shape), offset ]
+        offset += array.nbytes
+
+    header = json.dumps({ 'fields': fields, 'errors': errors, 'arrays': layout }).encode('utf-8')
+    data_offset = align(8 + len(header))
+
+    temp_path = '%s.%s.tmp'%(path, os.getpid())
+    with open(temp_path, 'wb') as f:
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for key, array in arrays.items():
+            f.seek(data_offset + layout[key][2])
+            f.write(array.tobytes())
+    os.replace(temp_path, path)
+
+def read_sidecar (path):
+    """ memory-maps a sidecar file written by write_sidecar, returning (data, errors).
+    Arrays are read-only views into the (single) mapping. """
+    raw = np.memmap(path, dtype=np.uint8, mode='r')
+    header_size = struct.unpack('<Q', raw[:8].tobytes())[0]
+    header = json.loads(raw[8:8 + header_size].tobytes().decode('utf-8'))
+    data_offset = align(8 + header_size)
+
+    data = dict(header['fields'])
+    for key, (dtype, shape, offset) in header['arrays'].items():
+        dtype = np.dtype(dtype)
+        start = data_offset + offset
+        count = int(np.prod(shape)) * dtype.itemsize
+        data[key] = raw[start:start + count].view(dtype).reshape(shape)
+    return data, header['errors']
+
+
+class MeshCache:
+    """ Disk cache of parsed .obj files (see read_obj.read_obj_arrays), stored as binary sidecars.
+
+    Entries are keyed by absolute path, size, mtime + parser options, so a changed file is just a
+    cache miss. Once the cache grows past max_bytes, the least recently used entries are evicted
+    (sidecar mtimes are bumped on every hit, and double as LRU timestamps).
+
+    Usage:
+        cache = MeshCache('./.cached_meshes', max_bytes = 4 << 30)
+        data, errors = read_obj_arrays(path, cache = cache)
+        print(cache.stats())
+    """
+
+    def __init__ (self, cache_dir = './.cached_meshes', max_bytes = 1 << 30):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.total_bytes = None
+
+    def sidecar_path (self, path, options):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = json.dumps([ path, stat.st_size, stat.st_mtime_ns, sorted(options.items()) ])
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + SIDECAR_EXT)
+
+    def read (self, path, parse, **options):
+        """ returns parse(path, **options) (ie. (data, errors)), from the cache if possible """
+        sidecar_path = self.sidecar_path(path, options)
+        try:
+            result = read_sidecar(sidecar_path)
+            os.utime(sidecar_path)
+            self.hits += 1
+            return result
+        except (FileNotFoundError, ValueError, struct.error):
+            pass
+
+        self.misses += 1
+        data, errors = parse(path, **options)
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir, exist_ok=True)
+        write_sidecar(sidecar_path, data, errors)
+        self.add_bytes(os.path.getsize(sidecar_path))
+        return data, errors
+
+    def list_entries (self):
+        """ returns [ (mtime, size, path) ] for every sidecar in the cache """
+        entries = []
+        if os.path.exists(self.cache_dir):
+            for file in os.listdir(self.cache_dir):
+                if file.endswith(SIDECAR_EXT):
+                    path = os.path.join(self.cache_dir, file)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def add_bytes (self, size):
+        if self.total_bytes is None:
+            self.total_bytes = sum(size for mtime, size, path in self.list_entries())
+        else:
+            self.total_bytes += size
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict (self):
+        """ removes least recently used sidecars until the cache fits in max_bytes """
+        entries = sorted(self.list_entries())
+        self.total_bytes = sum(size for mtime, size, path in entries)
+        for mtime, size, path in entries:
+            if self.total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= size
+
+    def clear (self):
+        for mtime, size, path in self.list_entries():
+            os.remove(path)
+        self.total_bytes = 0
+
+    def counts (self):
+        return self.hits, self.misses, self.evictions
+
+    def add_counts (self, hits, misses, evictions):
+        """ adds counts from a copy of this cache used in another process (eg. a pool worker, see
+        read_obj.extract_params), so stats() covers lookups made through every copy """
+        self.hits += hits
+        self.misses += misses
+        self.evictions += evictions
+
+    def stats (self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
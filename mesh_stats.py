@@ -0,0 +1,144 @@
+import os
+import sys
+import numpy as np
+
+#
+# Vectorized mesh statistics / validation, computed from parsed .obj arrays (see read_obj.read_obj_arrays)
+#
+
+DEFAULT_NORMALS_TOLERANCE = 1e-4
+DEFAULT_AREA_EPSILON = 1e-12
+
+def face_index_matrix (faces, face_sizes):
+    """ returns faces as a (# faces, max face size) matrix padded w/ -1, plus the padding mask """
+    num_faces = len(face_sizes)
+    max_size = int(face_sizes.max()) if num_faces else 0
+    mask = np.arange(max_size)[None, :] < face_sizes[:, None]
+    matrix = np.full((num_faces, max_size), -1, dtype=np.int64)
+    matrix[mask] = faces
+    return matrix, mask
+
+def resolve_face_indices (matrix, mask, num_verts):
+    """ converts .obj face indices (1-based, or negative = relative to the end of the vertex list)
+    to 0-based indices; returns (indices, in_range) where out of range indices are clamped to 0 """
+    indices = np.where(matrix < 0, matrix + num_verts, matrix - 1)
+    in_range = (matrix != 0) & (indices >= 0) & (indices < num_verts)
+    in_range |= ~mask
+    return np.where(in_range & mask, indices, 0), in_range
+
+def compute_mesh_stats (data,
+        normals_tolerance = DEFAULT_NORMALS_TOLERANCE,
+        area_epsilon = DEFAULT_AREA_EPSILON):
+    """ Computes per-mesh statistics + validation checks from read_obj_arrays data in one vectorized pass:
+        num_verts, num_normals, num_faces
+        bbox_min, bbox_max:         vertex bounding box (xyz), or None if there are no vertices
+        max_vertex_norm:            max vertex distance from the origin (<= 1.0 iff vertices are normalized)
+        max_normal_deviation:       max | |normal| - 1 |
+        bad_normals:                # of normals whose length deviates from 1 by more than normals_tolerance
+        out_of_range_indices:       # of face indices that don't reference a vertex
+        degenerate_faces:           # of faces w/ repeated vertices or (near) zero area
+        duplicate_faces:            # of faces that reference the same vertices as an earlier face
+
+    Returns a dict of python scalars / lists (json serializable).
+    """
+    verts = np.asarray(data['verts'], dtype=np.float64).reshape(-1, 3)
+    normals = np.asarray(data['normals'], dtype=np.float64).reshape(-1, 3)
+    faces = np.asarray(data['faces'], dtype=np.int64)
+    face_sizes = np.asarray(data.get('face_sizes', []), dtype=np.int64)
+    if not len(face_sizes) and len(faces) and data.get('face_count'):
+        face_sizes = np.full(len(faces) // data['face_count'], data['face_count'])
+
+    stats = {
+        'num_verts': len(verts),
+        'num_normals': len(normals),
+        'num_faces': len(face_sizes),
+        'bbox_min': verts.min(axis=0).tolist() if len(verts) else None,
+        'bbox_max': verts.max(axis=0).tolist() if len(verts) else None,
+        'max_vertex_norm': float(np.sqrt((verts * verts).sum(axis=1).max())) if len(verts) else 0.0,
+    }
+
+    normal_deviation = np.abs(np.sqrt((normals * normals).sum(axis=1)) - 1.0)
+    stats['max_normal_deviation'] = float(normal_deviation.max()) if len(normals) else 0.0
+    stats['bad_normals'] = int(np.count_nonzero(normal_deviation > normals_tolerance))
+
+    if not len(face_sizes):
+        stats.update(out_of_range_indices = 0, degenerate_faces = 0, duplicate_faces = 0)
+        return stats
+
+    matrix, mask = face_index_matrix(faces, face_sizes)
+    indices, in_range = resolve_face_indices(matrix, mask, len(verts))
+    stats['out_of_range_indices'] = int(np.count_nonzero(~in_range))
+
+    # repeated vertices: compare neighbours in each (sorted) face, ignoring padding
+    sorted_indices = np.sort(np.where(mask, indices, -1), axis=1)
+    repeated = ((sorted_indices[:, 1:] == sorted_indices[:, :-1]) & (sorted_indices[:, 1:] >= 0)).any(axis=1)
+
+    # (near) zero area: sum the triangle fan around each face's first vertex
+    degenerate = repeated | (face_sizes < 3)
+    if len(verts) and matrix.shape[1] >= 3:
+        points = verts[indices]
+        edges = points - points[:, :1]
+        fan = np.cross(edges[:, 1:-1], edges[:, 2:]) * mask[:, 2:, None]
+        area = 0.5 * np.sqrt((fan.sum(axis=1) ** 2).sum(axis=1))
+        degenerate |= area <= area_epsilon
+
+    # faces w/ out of range indices are only counted as such
+    valid = in_range.all(axis=1)
+    stats['degenerate_faces'] = int(np.count_nonzero(degenerate & valid))
+
+    unique_faces = np.unique(sorted_indices[valid], axis=0)
+    stats['duplicate_faces'] = int(np.count_nonzero(valid) - len(unique_faces))
+    return stats
+
+#
+# Columnar stats tables (one per dataset)
+#
+
+def build_stats_table (names, stats):
+    """ converts a list of names + a list of compute_mesh_stats() dicts to a columnar
+    { column: np.array } table (w/ the names in the 'name' column) """
+    table = { 'name': np.array(names, dtype=str) }
+    columns = sorted(set(key for row in stats for key in row))
+    for column in columns:
+        values = [ row.get(column) for row in stats ]
+        if column in ('bbox_min', 'bbox_max'):
+            values = [ value if value is not None else [ np.nan ] * 3 for value in values ]
+            table[column] = np.array(values, dtype=np.float64).reshape(-1, 3)
+        else:
+            table[column] = np.array(values)
+    return table
+
+def save_stats_table (path, table):
+    basedir = os.path.split(path)[0]
+    if basedir and not os.path.exists(basedir):
+        os.makedirs(basedir)
+    with open(path, 'wb') as f:
+        np.savez(f, **table)
+
+def load_stats_table (path):
+    with np.load(path) as table:
+        return { column: table[column] for column in table.files }
+
+def summarize_stats_table (table):
+    """ prints + returns the # of meshes failing each check in a stats table, as { 'meshes', <check>: count }
+    (all 0 for an empty table) """
+    num_meshes = len(table.get('name', ()))
+    print("%s meshes"%num_meshes)
+    checks = [
+        ('vertices not normalized', 'max_vertex_norm', 1.0),
+        ('bad normals',             'bad_normals', 0),
+        ('out of range indices',    'out_of_range_indices', 0),
+        ('degenerate faces',        'degenerate_faces', 0),
+        ('duplicate faces',         'duplicate_faces', 0),
+    ]
+    summary = { 'meshes': num_meshes }
+    for name, column, threshold in checks:
+        summary[name] = np.count_nonzero(table[column] > threshold) if num_meshes and column in table else 0
+        print("\t%s: %s / %s"%(name, summary[name], num_meshes))
+    return summary
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: %s <stats-table>.npz"%sys.argv[0])
+    else:
+        summarize_stats_table(load_stats_table(sys.argv[1]))
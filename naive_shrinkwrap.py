@@ -16,15 +16,23 @@ if sys.argv[0].split('.exe')[0].endswith('blender') and sys.argv[1] == '-b' and
 else:
     argv = sys.argv
 
-# re-run self from within blender if bpy not available.
+# re-run self from within blender if bpy not available (unless using the numpy backend, ie. --backend=numpy
+# or SHRINKWRAP_BACKEND=numpy, which doesn't need blender).
 # lets you run this script directly, while really running it from within blender's python install.
 # note: the code above is to fix imports (re-add the local working directory to the python search path)
 # when this happens
-from run_bpy import run_self
-run_self()
+from run_bpy import run_self, select_backend
+backend, argv = select_backend(argv)
+if backend == 'blender':
+    run_self()
 
 # End header...
-import bpy
+try:
+    import bpy
+except ImportError:
+    bpy = None      # numpy backend only
+
+DEFAULT_BACKEND = backend
 
 def clear_all_objects ():
     print("deleting %s objects: %s"%(
@@ -46,11 +54,48 @@ def import_and_join_obj (path, join_into = None):
     print("joined into %s"%ctx['active_object'])
     return ctx['active_object']
 
+def build_cube_template (subdivisions):
+    """ subdivides blender's default cube w/ the SUBSURF modifier, returning its { 'verts', 'normals', 'faces' }
+    (see numpy_shrinkwrap.load_cube_template, which caches it) """
+    import numpy as np
+    print("Building subdivided cube template (level %s)..."%subdivisions)
+    bpy.ops.mesh.primitive_cube_add()
+    cube = bpy.context.active_object
+    modifier = cube.modifiers.new(name='subdiv', type='SUBSURF')
+    modifier.levels = subdivisions
+    modifier.render_levels = subdivisions
+    bpy.context.scene.objects.active = cube
+    bpy.ops.object.modifier_apply(modifier='subdiv')
+    mesh = cube.data
+    template = {
+        'verts':    np.array([ vertex.co[:] for vertex in mesh.vertices ], dtype=np.float64),
+        'normals':  np.array([ vertex.normal[:] for vertex in mesh.vertices ], dtype=np.float64),
+        'faces':    np.array([ polygon.vertices[:] for polygon in mesh.polygons ], dtype=np.int64),
+    }
+    bpy.ops.object.delete()
+    return template
+
+def create_cube_from_template (subdivisions):
+    """ creates (+ selects) a copy of the default cube, already subdivided <subdivisions> times,
+    from a cached template, instead of re-applying a SUBSURF modifier for every shrinkwrap """
+    from numpy_shrinkwrap import load_cube_template
+    template = load_cube_template(subdivisions, 'blender', build_cube_template)
+    mesh = bpy.data.meshes.new('Cube')
+    mesh.from_pydata(template['verts'].tolist(), [], template['faces'].tolist())
+    mesh.update(calc_edges=True)
+    cube = bpy.data.objects.new('Cube', mesh)
+    bpy.context.scene.objects.link(cube)
+    cube.select = True
+    bpy.context.scene.objects.active = cube
+    return cube
+
 def apply_shrinkwrap (src, dst, subdivisions):
+    """ shrinkwraps dst onto src, subdividing it first (unless subdivisions is 0, eg. dst is already a template) """
     print("Creating modifiers...")
-    subdiv_modifier = dst.modifiers.new(name='subdiv', type='SUBSURF')
-    subdiv_modifier.levels = subdivisions
-    subdiv_modifier.render_levels = subdivisions
+    if subdivisions:
+        subdiv_modifier = dst.modifiers.new(name='subdiv', type='SUBSURF')
+        subdiv_modifier.levels = subdivisions
+        subdiv_modifier.render_levels = subdivisions
 
     shrinkwrap_modifier = dst.modifiers.new(name='shrinkwrap', type='SHRINKWRAP')
     shrinkwrap_modifier.target = src
@@ -61,7 +106,8 @@ def apply_shrinkwrap (src, dst, subdivisions):
 
     print("Applying modifiers...")
     bpy.context.scene.objects.active = dst
-    bpy.ops.object.modifier_apply(modifier='subdiv')
+    if subdivisions:
+        bpy.ops.object.modifier_apply(modifier='subdiv')
     bpy.ops.object.modifier_apply(modifier='shrinkwrap')
     print("Done")
     return dst
@@ -82,15 +128,22 @@ def export_obj (obj, path):
     )
     print("Done: exported to '%s'"%path)
 
-def execute_shrinkwrap (import_path, export_path, subdivisions):
+def execute_shrinkwrap (import_path, export_path, subdivisions, backend = None):
+    """ shrinkwraps a subdivided cube onto the .obj at import_path, and exports it to export_path,
+    using blender or the numpy backend (see numpy_shrinkwrap); defaults to the backend picked on the commandline """
+    if (backend or DEFAULT_BACKEND) == 'numpy':
+        import numpy_shrinkwrap
+        return numpy_shrinkwrap.execute_shrinkwrap(import_path, export_path, subdivisions)
+    if bpy is None:
+        raise Exception("The blender shrinkwrap backend has to run from within blender (or use --backend=numpy)")
+
     clear_all_objects()
     obj = import_and_join_obj(import_path)
-    result = bpy.ops.mesh.primitive_cube_add()
-    cube = bpy.context.active_object
+    cube = create_cube_from_template(subdivisions)
 
     print("Imported object = %s"%obj)                       # joined obj components
     print("Target object = %s"%cube)
-    apply_shrinkwrap(src=obj, dst=cube, subdivisions=subdivisions)
+    apply_shrinkwrap(src=obj, dst=cube, subdivisions=0)
 
     basedir = os.path.split(export_path)[0]
     if basedir and not os.path.exists(basedir):
@@ -99,7 +152,8 @@ def execute_shrinkwrap (import_path, export_path, subdivisions):
 
 if __name__ == '__main__':
     if len(argv) < 3:
-        print("Usage: %s <import-path>.obj <export-path>.obj [<num-subdivisions>]"%(args[0]))
+        print("Usage: %s <import-path>.obj <export-path>.obj [<num-subdivisions>] [--backend=blender|numpy]"%(argv[0]))
+        sys.exit()
 
     DEFAULT_SUBDIVISIONS = 2
     execute_shrinkwrap(
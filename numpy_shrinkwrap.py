@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+import os
+import sys
+import numpy as np
+from time import time
+from read_obj import read_obj_arrays, SHRINKWRAP_OBJ_HEADERS
+from mesh_stats import face_index_matrix, resolve_face_indices
+
+#
+# Pure numpy shrinkwrap backend (no blender): does the same thing as naive_shrinkwrap's blender backend, ie.
+#   1) subdivides blender's default cube w/ catmull-clark to <subdivisions> levels (SUBSURF modifier),
+#      once per level: see load_cube_template
+#   2) projects each vertex along its normal, in both directions, onto the source mesh (SHRINKWRAP modifier,
+#      PROJECT w/ use_positive_direction + use_negative_direction, no culling), keeping the nearest hit
+#   3) exports the result w/ a fixed vertex order (like export_scene.obj w/ keep_vertex_order=True)
+#
+# Everything is computed in blender's coordinate system (z up), w/ the same axis conversion as blender's
+# .obj importer / exporter (forward = -Z, up = Y), so outputs have the same shape + scale as the blender backend's.
+#
+# Outputs are NOT layout-compatible w/ the blender backend's, though: the subdivided cube has the same # of verts
+# + faces, but its vertex order (see subdivide) isn't blender's SUBSURF order, so vertex i (+ param i) of a numpy
+# export is not vertex i of a blender export. Don't mix exports from both backends in one dataset
+# (read_obj.extract_params rejects datasets that do, see read_obj.obj_shrinkwrap_backend).
+#
+
+# primitive_cube_add (blender 2.7x): 8 verts at +/- 1, 6 quads
+CUBE_VERTS = np.array([
+    [  1,  1, -1 ], [  1, -1, -1 ], [ -1, -1, -1 ], [ -1,  1, -1 ],
+    [  1,  1,  1 ], [  1, -1,  1 ], [ -1, -1,  1 ], [ -1,  1,  1 ],
+], dtype=np.float64)
+CUBE_FACES = np.array([
+    [ 0, 1, 2, 3 ], [ 4, 7, 6, 5 ], [ 0, 4, 5, 1 ], [ 1, 5, 6, 2 ], [ 2, 6, 7, 3 ], [ 4, 0, 3, 7 ],
+], dtype=np.int64)
+
+def obj_to_blender (verts):
+    """ .obj (y up) => blender (z up) coordinates, as done by blender's .obj importer """
+    return np.stack([ verts[:, 0], -verts[:, 2], verts[:, 1] ], axis=1)
+
+def blender_to_obj (verts):
+    """ blender (z up) => .obj (y up) coordinates, as done by blender's .obj exporter """
+    return np.stack([ verts[:, 0], verts[:, 2], -verts[:, 1] ], axis=1)
+
+#
+# Catmull-clark subdivision (closed quad meshes)
+#
+
+def mesh_edges (faces):
+    """ returns (edges, face_edges) for a (F x 4) quad mesh: edges is an (E x 2) array of vertex pairs, in order
+    of first appearance, and face_edges[f, i] is the index of the edge from faces[f, i] to faces[f, i + 1] """
+    corners = np.stack([ faces, np.roll(faces, -1, axis=1) ], axis=2).reshape(-1, 2)
+    keys = np.sort(corners, axis=1)
+    unique_keys, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return corners[first[order]], rank[inverse.ravel()].reshape(faces.shape)
+
+def subdivide (verts, faces):
+    """ one level of catmull-clark subdivision of a closed quad mesh.
+    New vertices are ordered as: original vertices, then edge points, then face points;
+    each face f is split into 4 quads (in corner order): (v[i], e[i], f, e[i - 1]).
+    This is not the vertex order of blender's SUBSURF modifier (see the note at the top of this file) """
+    num_verts, num_faces = len(verts), len(faces)
+    edges, face_edges = mesh_edges(faces)
+    num_edges = len(edges)
+
+    face_points = verts[faces].mean(axis=1)
+
+    # each (closed mesh) edge has 2 faces: edge point = average of its endpoints + both face points
+    edge_face_sums = np.zeros((num_edges, 3))
+    np.add.at(edge_face_sums, face_edges.ravel(), np.repeat(face_points, 4, axis=0))
+    edge_points = (verts[edges[:, 0]] + verts[edges[:, 1]] + edge_face_sums) / 4
+
+    # original vertices: (F + 2R + (n - 3)P) / n, F = average of adjacent face points, R = of adjacent edge midpoints
+    valence = np.bincount(edges.ravel(), minlength=num_verts).astype(np.float64)
+    face_sums = np.zeros((num_verts, 3))
+    np.add.at(face_sums, faces.ravel(), np.repeat(face_points, 4, axis=0))
+    face_counts = np.bincount(faces.ravel(), minlength=num_verts).astype(np.float64)
+    midpoints = (verts[edges[:, 0]] + verts[edges[:, 1]]) / 2
+    edge_sums = np.zeros((num_verts, 3))
+    np.add.at(edge_sums, edges[:, 0], midpoints)
+    np.add.at(edge_sums, edges[:, 1], midpoints)
+    n = valence[:, None]
+    new_verts = (face_sums / face_counts[:, None] + 2 * edge_sums / n + (n - 3) * verts) / n
+
+    vertex_ids = faces
+    edge_ids = num_verts + face_edges
+    face_ids = num_verts + num_edges + np.arange(num_faces)
+    new_faces = np.stack([
+        vertex_ids,
+        edge_ids,
+        np.repeat(face_ids[:, None], 4, axis=1),
+        np.roll(edge_ids, 1, axis=1),
+    ], axis=2).reshape(-1, 4)
+    return np.concatenate([ new_verts, edge_points, face_points ]), new_faces
+
+def subdivided_cube (subdivisions):
+    """ returns (verts, faces) for blender's default cube, subdivided <subdivisions> times """
+    verts, faces = CUBE_VERTS, CUBE_FACES
+    for i in range(subdivisions):
+        verts, faces = subdivide(verts, faces)
+    return verts, faces
+
+def vertex_normals (verts, faces):
+    """ area weighted vertex normals of a quad mesh """
+    quads = verts[faces]
+    face_normals = np.cross(quads[:, 2] - quads[:, 0], quads[:, 3] - quads[:, 1]) / 2
+    normals = np.zeros_like(verts)
+    np.add.at(normals, faces.ravel(), np.repeat(face_normals, 4, axis=0))
+    lengths = np.sqrt((normals * normals).sum(axis=1))[:, None]
+    return normals / np.where(lengths > 0, lengths, 1)
+
+#
+# Subdivided cube templates: each level only has to be subdivided once, then it's cached (in memory + on disk)
+#
+
+TEMPLATE_VERSION = 1
+TEMPLATE_DIR = os.environ.get('SHRINKWRAP_TEMPLATE_DIR',
+    os.path.join(os.path.split(os.path.abspath(__file__))[0], '.cached_templates'))
+TEMPLATE_LEVELS = range(7)
+TEMPLATES = {}
+
+def template_path (subdivisions, backend = 'numpy', template_dir = None):
+    return os.path.join(template_dir or TEMPLATE_DIR, 'cube-%s-%d.v%d.npz'%(backend, subdivisions, TEMPLATE_VERSION))
+
+def build_cube_template (subdivisions):
+    """ returns { 'verts', 'normals', 'faces' } of blender's default cube, subdivided <subdivisions> times """
+    verts, faces = subdivided_cube(subdivisions)
+    return { 'verts': verts, 'normals': vertex_normals(verts, faces), 'faces': faces }
+
+def load_cube_template (subdivisions, backend = 'numpy', build = build_cube_template, template_dir = None):
+    """ Returns the subdivided cube template { 'verts', 'normals', 'faces' } for a subdivision level,
+    from memory, <template_dir>/cube-<backend>-<level>.v<version>.npz, or by calling build(subdivisions)
+    (+ caching the result). Templates are shared between calls: don't modify them in place.
+
+    backend keys the cache, since each backend builds its templates w/ its own vertex order
+    (eg. naive_shrinkwrap's blender backend caches the result of blender's SUBSURF modifier).
+    """
+    key = (backend, subdivisions, template_dir or TEMPLATE_DIR)
+    if key not in TEMPLATES:
+        path = template_path(subdivisions, backend, template_dir)
+        template = None
+        if os.path.exists(path):
+            try:
+                with np.load(path) as data:
+                    template = { name: data[name] for name in ('verts', 'normals', 'faces') }
+            except (OSError, ValueError, KeyError):
+                template = None
+        if template is None:
+            template = build(subdivisions)
+            save_cube_template(path, template)
+        for array in template.values():
+            array.flags.writeable = False
+        TEMPLATES[key] = template
+    return TEMPLATES[key]
+
+def save_cube_template (path, template):
+    """ writes a template to path, atomically (temp file + rename), since several workers may build it at once """
+    basedir = os.path.split(path)[0]
+    if basedir and not os.path.exists(basedir):
+        os.makedirs(basedir, exist_ok=True)
+    temp_path = '%s.%s.tmp'%(path, os.getpid())
+    with open(temp_path, 'wb') as f:
+        np.savez(f, **template)
+    os.replace(temp_path, path)
+
+def build_cube_templates (levels = TEMPLATE_LEVELS, template_dir = None):
+    """ precomputes (+ caches) the numpy templates for each subdivision level """
+    for level in levels:
+        t0 = time()
+        template = load_cube_template(level, template_dir=template_dir)
+        print("level %d: %s verts, %s faces (%0.2fs) => '%s'"%(
+            level, len(template['verts']), len(template['faces']), time() - t0, template_path(level, 'numpy', template_dir)))
+
+#
+# Ray casting: cluster BVH (triangles sorted along a morton curve + grouped into fixed size clusters, w/ a binary
+# tree of bounding boxes over the clusters, built by merging neighbouring boxes level by level)
+#
+
+def spread_bits (x):
+    """ spreads the low 21 bits of x so there are 2 zero bits between each (for 3d morton codes) """
+    x = x.astype(np.uint64) & np.uint64(0x1fffff)
+    for shift, mask in ((32, 0x1f00000000ffff), (16, 0x1f0000ff0000ff), (8, 0x100f00f00f00f00f),
+                        (4, 0x10c30c30c30c30c3), (2, 0x1249249249249249)):
+        x = (x | (x << np.uint64(shift))) & np.uint64(mask)
+    return x
+
+def build_cluster_bvh (triangles, cluster_size = 16):
+    """ groups (T x 3 x 3) triangles into spatially coherent clusters of cluster_size triangles, + builds a
+    binary tree of bounding boxes over them. Returns
+        { 'triangles': (K x cluster_size x 3 x 3),
+          'levels': [ (lo, hi) ] }   node boxes (N x 3) for each level of the tree, from the root (1 node) down to
+                                     the clusters (K nodes); node i's children are nodes 2i + 2i + 1 of the next level
+    """
+    centroids = triangles.mean(axis=1)
+    lo, hi = centroids.min(axis=0), centroids.max(axis=0)
+    cells = ((centroids - lo) / np.maximum(hi - lo, 1e-12) * ((1 << 21) - 1)).astype(np.uint64)
+    codes = spread_bits(cells[:, 0]) | (spread_bits(cells[:, 1]) << np.uint64(1)) | (spread_bits(cells[:, 2]) << np.uint64(2))
+    triangles = triangles[np.argsort(codes, kind='stable')]
+
+    # pad w/ copies of the last triangle (duplicate hits don't change the nearest hit)
+    padding = -len(triangles) % cluster_size
+    triangles = np.concatenate([ triangles, np.repeat(triangles[-1:], padding, axis=0) ])
+    clusters = triangles.reshape(-1, cluster_size, 3, 3)
+
+    # boxes are padded slightly, so rays grazing a box face (eg. along an axis plane) still hit it
+    padding = 1e-6 * max(float(np.abs(triangles).max()), 1.0)
+    levels = [ (clusters.min(axis=(1, 2)) - padding, clusters.max(axis=(1, 2)) + padding) ]
+    while len(levels[-1][0]) > 1:
+        lo, hi = levels[-1]
+        if len(lo) % 2:
+            lo, hi = np.concatenate([ lo, lo[-1:] ]), np.concatenate([ hi, hi[-1:] ])
+        levels.append((np.minimum(lo[0::2], lo[1::2]), np.maximum(hi[0::2], hi[1::2])))
+    return { 'triangles': clusters, 'levels': levels[::-1] }
+
+def intersect_lines (origins, directions, triangles, epsilon = 1e-12):
+    """ moller-trumbore intersection of lines (origin + t * direction, for any t) w/ triangles, pairwise:
+    origins, directions are (P x 3), triangles (P x C x 3 x 3). Returns t (P x C), nan where there's no hit """
+    # (written out per component: np.cross + sums over length 3 axes are several times slower)
+    ox, oy, oz = (origins[:, None, i] for i in range(3))
+    dx, dy, dz = (directions[:, None, i] for i in range(3))
+    v0x, v0y, v0z = (triangles[:, :, 0, i] for i in range(3))
+    e1x, e1y, e1z = (triangles[:, :, 1, i] - triangles[:, :, 0, i] for i in range(3))
+    e2x, e2y, e2z = (triangles[:, :, 2, i] - triangles[:, :, 0, i] for i in range(3))
+    px, py, pz = dy * e2z - dz * e2y, dz * e2x - dx * e2z, dx * e2y - dy * e2x
+    det = e1x * px + e1y * py + e1z * pz
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inv_det = 1.0 / det
+        tx, ty, tz = ox - v0x, oy - v0y, oz - v0z
+        u = (tx * px + ty * py + tz * pz) * inv_det
+        qx, qy, qz = ty * e1z - tz * e1y, tz * e1x - tx * e1z, tx * e1y - ty * e1x
+        v = (dx * qx + dy * qy + dz * qz) * inv_det
+        t = (e2x * qx + e2y * qy + e2z * qz) * inv_det
+        hit = (np.abs(det) > epsilon) & (u >= 0) & (v >= 0) & (u + v <= 1)
+    return np.where(hit, t, np.nan)
+
+def line_box_intervals (origins, inv_directions, lo, hi):
+    """ slab test (w/ unbounded t) of lines against boxes, pairwise (all arguments are (P x 3)):
+    returns (tmin, tmax), the range of t where each line is inside its box (empty if tmin > tmax) """
+    t1 = (lo - origins) * inv_directions
+    t2 = (hi - origins) * inv_directions
+    near, far = np.minimum(t1, t2), np.maximum(t1, t2)
+    return (np.maximum(np.maximum(near[:, 0], near[:, 1]), near[:, 2]),
+            np.minimum(np.minimum(far[:, 0], far[:, 1]), far[:, 2]))
+
+def traverse_cluster_bvh (origins, inv_directions, bvh):
+    """ returns (rays, clusters, distances) for every cluster whose box each line hits, where distance is the
+    smallest |t| at which the line is inside the box. The tree is traversed for all lines at once, one level at
+    a time, so only (line, node) pairs that hit the level above are tested """
+    levels = bvh['levels']
+    rays, nodes = np.arange(len(origins)), np.zeros(len(origins), dtype=np.int64)
+    for depth, (lo, hi) in enumerate(levels):
+        tmin, tmax = line_box_intervals(origins[rays], inv_directions[rays], lo[nodes], hi[nodes])
+        hit = tmin <= tmax
+        rays, nodes, tmin, tmax = rays[hit], nodes[hit], tmin[hit], tmax[hit]
+        if depth + 1 < len(levels):
+            rays, nodes = np.repeat(rays, 2), (nodes[:, None] * 2 + np.arange(2)).ravel()
+            valid = nodes < len(levels[depth + 1][0])
+            rays, nodes = rays[valid], nodes[valid]
+    distances = np.where((tmin <= 0) & (tmax >= 0), 0.0, np.minimum(np.abs(tmin), np.abs(tmax)))
+    return rays, nodes, distances
+
+def project_points (points, directions, bvh, ray_chunk = 512, pair_chunk = 8192, first_batch = 4):
+    """ Casts a line through each point (in both directions) + returns the signed distance to the nearest
+    triangle along it (nan if it doesn't hit anything).
+
+    Each line's clusters are tested nearest box first, in batches (of first_batch clusters per line, then
+    twice as many each round), skipping boxes further away than the nearest hit found so far.
+    """
+    nearest = np.full(len(points), np.nan)
+    safe_directions = np.where(np.abs(directions) < 1e-12, np.copysign(1e-12, directions), directions)
+    for start in range(0, len(points), ray_chunk):
+        rays, clusters, distances = traverse_cluster_bvh(points[start:start + ray_chunk],
+            1.0 / safe_directions[start:start + ray_chunk], bvh)
+        if not len(rays):
+            continue
+        rays += start
+
+        # sort by ray, then box distance, + number each ray's clusters (rank 0 = nearest box)
+        order = np.lexsort((distances, rays))
+        rays, clusters, distances = rays[order], clusters[order], distances[order]
+        group_starts = np.r_[0, np.flatnonzero(rays[1:] != rays[:-1]) + 1]
+        rank = np.arange(len(rays)) - np.repeat(group_starts, np.diff(np.r_[group_starts, len(rays)]))
+
+        lo, hi = 0, first_batch
+        while lo <= rank.max():
+            # (distances > nan is False: lines w/out a hit yet test every box in the batch)
+            batch = np.flatnonzero((rank >= lo) & (rank < hi) & ~(distances > np.abs(nearest[rays])))
+            for pair_start in range(0, len(batch), pair_chunk):
+                pairs = batch[pair_start:pair_start + pair_chunk]
+                update_nearest(nearest, rays[pairs],
+                    intersect_lines(points[rays[pairs]], directions[rays[pairs]], bvh['triangles'][clusters[pairs]]))
+            lo, hi = hi, hi * 2
+    return nearest
+
+def update_nearest (nearest, ray_ids, t):
+    """ updates nearest[ray] w/ the nearest hit (smallest |t|, ignoring nans) in each row of t (P x C) """
+    best = np.argmin(np.where(np.isnan(t), np.inf, np.abs(t)), axis=1)
+    t = t[np.arange(len(t)), best]
+
+    # nearest hit per ray (sorted by ray, then distance: keep the first of each ray)
+    hit = ~np.isnan(t)
+    if not hit.any():
+        return
+    ray_ids, t = ray_ids[hit], t[hit]
+    order = np.lexsort((np.abs(t), ray_ids))
+    ray_ids, t = ray_ids[order], t[order]
+    first = np.r_[True, ray_ids[1:] != ray_ids[:-1]]
+    ray_ids, t = ray_ids[first], t[first]
+    current = nearest[ray_ids]
+    closer = np.isnan(current) | (np.abs(t) < np.abs(current))
+    nearest[ray_ids[closer]] = t[closer]
+
+#
+# Shrinkwrap
+#
+
+def load_triangles (path):
+    """ reads an .obj file, returning its (fan triangulated) faces as a (T x 3 x 3) array in blender coordinates """
+    data, errors = read_obj_arrays(path,
+        check_verts_normalized=False, check_normals_normalized=False, check_face_index_bounds=False)
+    verts = obj_to_blender(np.asarray(data['verts'], dtype=np.float64))
+    matrix, mask = face_index_matrix(np.asarray(data['faces'], dtype=np.int64), np.asarray(data['face_sizes'], dtype=np.int64))
+    indices, in_range = resolve_face_indices(matrix, mask, len(verts))
+    faces = indices[in_range.all(axis=1) & (mask.sum(axis=1) >= 3)]
+    fan_mask = mask[in_range.all(axis=1) & (mask.sum(axis=1) >= 3)]
+    triangles = [
+        np.stack([ faces[:, 0], faces[:, i], faces[:, i + 1] ], axis=1)[fan_mask[:, i + 1]]
+        for i in range(1, matrix.shape[1] - 1)
+    ]
+    if not triangles or not sum(len(tris) for tris in triangles):
+        raise Exception("No faces in '%s'%s"%(path, ': %s'%errors if errors else ''))
+    return verts[np.concatenate(triangles)]
+
+def apply_shrinkwrap (triangles, subdivisions):
+    """ returns (verts, faces) of blender's default cube, subdivided + shrinkwrapped onto triangles
+    (in blender coordinates) """
+    template = load_cube_template(subdivisions)
+    normals = template['normals']
+    t = project_points(template['verts'], normals, build_cluster_bvh(triangles))
+    hit = ~np.isnan(t)
+    verts = template['verts'].copy()
+    verts[hit] += normals[hit] * t[hit, None]
+    return verts, template['faces']
+
+def write_obj (path, verts, faces, normals = None):
+    """ writes a quad mesh as an .obj file (w/ 1-based indices, in the given vertex order) """
+    with open(path, 'w') as f:
+        f.write("%s\no Cube\n"%SHRINKWRAP_OBJ_HEADERS['numpy'])
+        np.savetxt(f, verts, fmt='v %.6f %.6f %.6f')
+        if normals is not None:
+            np.savetxt(f, normals, fmt='vn %.4f %.4f %.4f')
+            np.savetxt(f, np.repeat(faces + 1, 2, axis=1), fmt='f %d//%d %d//%d %d//%d %d//%d')
+        else:
+            np.savetxt(f, faces + 1, fmt='f %d %d %d %d')
+
+def execute_shrinkwrap (import_path, export_path, subdivisions):
+    """ same as naive_shrinkwrap.execute_shrinkwrap, w/out blender """
+    t0 = time()
+    triangles = load_triangles(import_path)
+    verts, faces = apply_shrinkwrap(triangles, subdivisions)
+
+    basedir = os.path.split(export_path)[0]
+    if basedir and not os.path.exists(basedir):
+        os.makedirs(basedir)
+    write_obj(export_path, blender_to_obj(verts), faces, blender_to_obj(vertex_normals(verts, faces)))
+    print("Done: exported to '%s' (%s triangles, %s verts, %0.2fs)"%(export_path, len(triangles), len(verts), time() - t0))
+
+#
+# Vertex order / topology validation
+#
+
+def validate_vertex_order (path, reference_path, tolerance = None):
+    """ Checks that an exported shrinkwrap has the same vertex order + topology as a reference export
+    (from the same backend, eg. to check a change to this one): same # of vertices, same faces (as
+    vertex index lists, up to the starting corner), and, if tolerance is given, vertex positions within
+    tolerance of each other. Returns a list of errors (empty if they match).
+    Against a blender export this reports the (expected) face mismatches, since the vertex orders differ. """
+    data, _ = read_obj_arrays(path, check_verts_normalized=False, check_normals_normalized=False)
+    reference, _ = read_obj_arrays(reference_path, check_verts_normalized=False, check_normals_normalized=False)
+    errors = []
+    if len(data['verts']) != len(reference['verts']):
+        return [ "%s verts != %s verts in reference"%(len(data['verts']), len(reference['verts'])) ]
+    if not np.array_equal(data['face_sizes'], reference['face_sizes']):
+        return [ "face sizes differ from the reference (%s vs %s faces)"%(len(data['face_sizes']), len(reference['face_sizes'])) ]
+
+    def canonical_faces (data):
+        matrix, mask = face_index_matrix(np.asarray(data['faces'], dtype=np.int64), np.asarray(data['face_sizes'], dtype=np.int64))
+        indices = resolve_face_indices(matrix, mask, len(data['verts']))[0]
+        rotations = np.stack([ np.roll(indices, -i, axis=1) for i in range(indices.shape[1]) ], axis=1)
+        return rotations[np.arange(len(indices)), np.argmin(indices, axis=1)]
+
+    mismatched = np.count_nonzero((canonical_faces(data) != canonical_faces(reference)).any(axis=1))
+    if mismatched:
+        errors.append("%s / %s faces differ from the reference"%(mismatched, len(data['face_sizes'])))
+    if tolerance is not None:
+        distance = np.sqrt(((data['verts'] - reference['verts']) ** 2).sum(axis=1))
+        if distance.max() > tolerance:
+            errors.append("%s verts are further than %s from the reference (max %s, at vertex %s)"%(
+                np.count_nonzero(distance > tolerance), tolerance, distance.max(), np.argmax(distance)))
+    return errors
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 4 and sys.argv[1] == '--validate':
+        errors = validate_vertex_order(sys.argv[2], sys.argv[3], float(sys.argv[4]) if len(sys.argv) > 4 else None)
+        for error in errors:
+            print("Error: %s"%error)
+        print("OK" if not errors else "%s errors"%len(errors))
+        sys.exit(1 if errors else 0)
+    elif len(sys.argv) >= 2 and sys.argv[1] == '--build-templates':
+        build_cube_templates([ int(arg) for arg in sys.argv[2:] ] or TEMPLATE_LEVELS)
+    elif len(sys.argv) < 3:
+        print("Usage: %s <import-path>.obj <export-path>.obj [<num-subdivisions>]"%sys.argv[0])
+        print("       %s --validate <export>.obj <reference-export>.obj [<tolerance>]"%sys.argv[0])
+        print("       %s --build-templates [<levels...>]"%sys.argv[0])
+    else:
+        execute_shrinkwrap(sys.argv[1], sys.argv[2], 2 if len(sys.argv) < 4 else int(sys.argv[3]))
@@ -1,6 +1,14 @@
 import os
+import io
+import hashlib
 import sys
-from serialization_utils import serialize_object, deserialize_object
+import mmap
+import multiprocessing
+import numpy as np
+from time import time
+from serialization_utils import serialize_object, deserialize_object, ParamDatasetWriter, hash_file
+from mesh_stats import compute_mesh_stats, build_stats_table, save_stats_table, summarize_stats_table, DEFAULT_NORMALS_TOLERANCE
+from zip_index import ZipMemberIndex, archive_map
 
 
 def parse_obj_line (line, data, 
@@ -8,6 +16,7 @@ def parse_obj_line (line, data,
         expect_verts_normalized = True, 
         check_normals_normalized = True,
         expect_normals_normalized = True, 
+        normals_tolerance = 1e-4,
         check_face_index_bounds = True,
         expect_face_count = None,
         expect_consistent_face_count = True,
@@ -27,7 +36,7 @@ def parse_obj_line (line, data,
     elif line.startswith('vn '):
         x, y, z = map(float, line[3:].strip().split())
         if check_normals_normalized:
-            normalized = x * x + y * y + z * z == 1.0
+            normalized = abs(x * x + y * y + z * z - 1.0) <= normals_tolerance
             if not normalized:
                 data['normals_normalized'] = False
                 if expect_normals_normalized:
@@ -62,8 +71,28 @@ def parse_obj_line (line, data,
         data['faces'] += indices
 
 
+def is_file_object (path):
+    return hasattr(path, 'read')
+
+def source_name (path):
+    """ name of an .obj source (a path, or a file-like object, eg. an archive member) for error messages """
+    return getattr(path, 'name', '<stream>') if is_file_object(path) else path
+
+def iter_obj_lines (path):
+    """ yields the lines of an .obj file, given a path or a (binary or text) file-like object """
+    if not is_file_object(path):
+        with open(path, 'r') as f:
+            yield from f
+    else:
+        for line in path:
+            yield line.decode('utf-8') if isinstance(line, bytes) else line
+
 def read_obj (path, check_face_index_bounds = True, **kwargs):
-    """ Reads the vertex, vertex normal, and face components of an .obj file.
+    """ Reads the vertex, vertex normal, and face components of an .obj file
+    (a path, or a file-like object, eg. ShapenetZipArchive.open(...)).
+
+    Parsed w/ the vectorized reader (see parse_obj_arrays), then converted to lists. Files w/ any
+    errors are re-read line by line (see read_obj_lines), so errors are reported per line.
 
     Returns data, errors where
         errors:             list or None
@@ -72,7 +101,7 @@ def read_obj (path, check_face_index_bounds = True, **kwargs):
         data['faces']:      flat list of face indices. May be negative.
         data['face_count']: num elements per face. expected to be 3 (tris) or 4 (quads)
         data['verts_normalized']:   True iff vertex elements are all in [0, 1]
-        data['normals_normalized']: True iff normals all have length 1
+        data['normals_normalized']: True iff normals all have length 1 (+/- normals_tolerance)
 
     See parse_obj_line for full kwargs.
 
@@ -83,6 +112,28 @@ def read_obj (path, check_face_index_bounds = True, **kwargs):
             raise Exception("Failed to read '%s' (%d errors):\n\t"%(
                 path, len(errors), '\n\t'.join(errors)))
     """
+    if is_file_object(path):
+        text = path.read()
+        source = io.BytesIO(text.encode('utf-8') if isinstance(text, str) else text)
+        source.name = source_name(path)
+    else:
+        source = path
+
+    data, errors = parse_obj_arrays(source, check_face_index_bounds=check_face_index_bounds, **kwargs)
+    if errors:
+        if is_file_object(source):
+            source.seek(0)
+        return read_obj_lines(source, check_face_index_bounds=check_face_index_bounds, **kwargs)
+
+    del data['face_sizes']
+    data['verts']   = list(map(tuple, data['verts'].tolist()))
+    data['normals'] = list(map(tuple, data['normals'].tolist()))
+    data['faces']   = data['faces'].tolist()
+    return data, None
+
+def read_obj_lines (path, check_face_index_bounds = True, **kwargs):
+    """ The per-line .obj reader (see parse_obj_line): same args + results as read_obj, but slower.
+    Reports each error w/ its line """
 
     data = {
         'min_face_index': 0, 'max_face_index': 0, 'face_count': None,
@@ -93,13 +144,12 @@ def read_obj (path, check_face_index_bounds = True, **kwargs):
     }
 
     errors = []
-    with open(path, 'r') as f:
-        for i, line in enumerate(f):
-            try:
-                parse_obj_line(line, data, check_face_index_bounds=check_face_index_bounds, **kwargs)
-            except Exception as e:
-                errors.append("error at %s:%d '%s':\n\t%s"%(
-                    path, i, line.strip(), e))
+    for i, line in enumerate(iter_obj_lines(path)):
+        try:
+            parse_obj_line(line, data, check_face_index_bounds=check_face_index_bounds, **kwargs)
+        except Exception as e:
+            errors.append("error at %s:%d '%s':\n\t%s"%(
+                source_name(path), i, line.strip(), e))
 
     # Check consistency...
     if check_face_index_bounds:
@@ -114,48 +164,444 @@ def read_obj (path, check_face_index_bounds = True, **kwargs):
     return data, (errors or None)
 
 
+#
+# Vectorized (numpy) .obj reader
+#
+
+# split_obj_records slices runs of same-kind lines straight out of the buffer; blocks w/ more runs than this
+# (eg. 'v' + 'vn' records interleaved line by line) are split w/ per-character masks instead
+MAX_RECORD_RUNS = 1024
+
+def split_obj_records (buf):
+    """ Splits a block of .obj text (bytes) into the payloads of its 'v', 'vn' and 'f' records.
+
+    Lines are classified w/ numpy (no per-line python), and each kind of record is
+    returned as one bytes object w/ its prefix blanked out + one record per line.
+    Returns (verts, num_verts), (normals, num_normals), (faces, num_faces)
+    """
+    chars = np.frombuffer(buf, dtype=np.uint8)
+    if not len(chars):
+        return (b'', 0), (b'', 0), (b'', 0)
+
+    starts = np.concatenate(([0], np.flatnonzero(chars == ord('\n')) + 1))
+    if starts[-1] == len(chars):
+        starts = starts[:-1]
+
+    padded = np.concatenate((chars, np.zeros(3, dtype=np.uint8)))
+    c0, c1, c2 = padded[starts], padded[starts + 1], padded[starts + 2]
+    kinds = np.zeros(len(starts), dtype=np.int8)
+    kinds[(c0 == ord('v')) & (c1 == ord(' '))] = 1
+    kinds[(c0 == ord('v')) & (c1 == ord('n')) & (c2 == ord(' '))] = 2
+    kinds[(c0 == ord('f')) & (c1 == ord(' '))] = 3
+
+    boundaries = np.flatnonzero(kinds[1:] != kinds[:-1]) + 1
+    if len(boundaries) >= MAX_RECORD_RUNS:
+        return split_obj_records_masked(chars, starts, kinds)
+    run_kinds = kinds[np.concatenate(([0], boundaries))]
+    run_starts = starts[np.concatenate(([0], boundaries))]
+    run_ends = np.concatenate((starts[boundaries], [len(chars)]))
+
+    def select (kind, prefix_size):
+        runs = np.flatnonzero(run_kinds == kind)
+        if not len(runs):
+            return b'', 0
+        text = np.concatenate([ chars[start:end] for start, end in zip(run_starts[runs].tolist(), run_ends[runs].tolist()) ])
+        # blank out the record prefixes (at each line start, moved by the bytes skipped before its run)
+        lengths = run_ends[runs] - run_starts[runs]
+        shifts = run_starts[runs] - (np.cumsum(lengths) - lengths)
+        line_starts = starts[kinds == kind]
+        line_starts = line_starts - shifts[np.searchsorted(run_starts[runs], line_starts, 'right') - 1]
+        for i in range(prefix_size):
+            text[line_starts + i] = ord(' ')
+        return text.tobytes(), len(line_starts)
+
+    return select(1, 1), select(2, 2), select(3, 1)
+
+def split_obj_records_masked (chars, starts, kinds):
+    """ split_obj_records for blocks w/ record kinds interleaved line by line: copies each kind
+    of record out w/ a per-character mask """
+    lengths = np.diff(np.concatenate((starts, [len(chars)])))
+
+    # blank out the record prefixes, so that each selected line is just its values
+    text = chars.copy()
+    text[starts[kinds != 0]] = ord(' ')
+    text[starts[kinds == 2] + 1] = ord(' ')
+
+    def select (kind):
+        is_kind = kinds == kind
+        return text[np.repeat(is_kind, lengths)].tobytes(), int(np.count_nonzero(is_kind))
+
+    return select(1), select(2), select(3)
+
+def parse_float_records (text, count, width, kind):
+    """ parses <count> lines of 'x y z' records into a (count, width) float64 array """
+    try:
+        values = np.fromstring(text, dtype=np.float64, sep=' ')
+    except ValueError:
+        values = None
+    if values is None or values.size != count * width:
+        raise Exception("malformed '%s' records (expected %s values per line)"%(kind, width))
+    return values.reshape(count, width)
+
+def parse_face_records (text, count):
+    """ parses <count> lines of 'f' records ('a b c', 'a/ta/na ...', 'a//na ...', etc) into
+    a flat array of vertex indices + an array of the # of indices in each face """
+    chars = np.frombuffer(text, dtype=np.uint8)
+    is_space = chars <= ord(' ')
+    token_starts = ~is_space
+    token_starts[1:] &= is_space[:-1]
+    token_starts = np.flatnonzero(token_starts)
+    line_ends = np.concatenate((np.flatnonzero(chars == ord('\n')), [len(chars)]))[:count]
+    face_sizes = np.diff(np.searchsorted(token_starts, line_ends), prepend=0).astype(np.int32)
+
+    if b'/' in text:
+        # keep each vertex's index only ('a/ta/na' => 'a', same as read_obj, whatever the format of each vertex):
+        # copies out each vertex's characters up to its first '/' (or its end), followed by a space
+        is_token = ~is_space
+        is_token[:-1] &= is_space[1:]
+        token_ends = np.flatnonzero(is_token) + 1
+        slashes = np.flatnonzero(chars == ord('/'))
+        # if every vertex has the same # of '/'s as the first one (ie. the same format), each vertex's first
+        # '/' is every <n>th one; otherwise look them up
+        per_token = int(np.count_nonzero(slashes < token_ends[0]))
+        first_slashes = slashes[::per_token] if per_token else slashes[:0]
+        uniform = len(slashes) == per_token * len(token_starts) and bool(
+            np.all(first_slashes >= token_starts) and np.all(slashes[per_token - 1::per_token] < token_ends))
+        if not uniform:
+            first_slashes = slashes[np.minimum(np.searchsorted(slashes, token_starts), len(slashes) - 1)]
+        ends = np.where((first_slashes >= token_starts) & (first_slashes < token_ends), first_slashes, token_ends)
+        lengths = ends - token_starts + 1
+        offsets = np.cumsum(lengths) - lengths
+        positions = np.arange(int(lengths.sum())) + np.repeat(token_starts - offsets, lengths)
+        indices = np.append(chars, np.uint8(ord(' ')))[positions]
+        indices[offsets + lengths - 1] = ord(' ')
+        text = indices.tobytes()
+
+    try:
+        values = np.fromstring(text, dtype=np.int64, sep=' ')
+    except ValueError:
+        values = None
+    if values is None or values.size != len(token_starts):
+        raise Exception("malformed 'f' records")
+    return values, face_sizes
+
+def parse_obj_buffer (buf):
+    """ Parses the vertex, vertex normal, and face records of a block of .obj text (bytes).
+
+    Returns verts (N x 3 float64), normals (M x 3 float64), faces (flat int64), face_sizes (int32)
+    """
+    (verts, num_verts), (normals, num_normals), (faces, num_faces) = split_obj_records(buf)
+    verts   = parse_float_records(verts, num_verts, 3, 'v')
+    normals = parse_float_records(normals, num_normals, 3, 'vn')
+    faces, face_sizes = parse_face_records(faces, num_faces)
+    return verts, normals, faces, face_sizes
+
+def validate_obj_arrays (path, data, verts, normals, faces, face_sizes,
+        check_verts_normalized = True,
+        expect_verts_normalized = True,
+        check_normals_normalized = True,
+        expect_normals_normalized = True,
+        normals_tolerance = 1e-4,
+        check_face_index_bounds = True,
+        expect_face_count = None,
+        expect_consistent_face_count = True,
+        **kwargs):
+    """ Vectorized equivalent of the per-line checks in parse_obj_line.
+    Updates the validation fields of data, and returns a list of errors.
+    """
+    errors = []
+    if check_verts_normalized and len(verts):
+        bad_verts = np.count_nonzero((verts * verts).sum(axis=1) > 1.0)
+        if bad_verts:
+            data['verts_normalized'] = False
+            if expect_verts_normalized:
+                errors.append("error at %s: %d vertices not normalized!"%(path, bad_verts))
+
+    if check_normals_normalized and len(normals):
+        bad_normals = np.count_nonzero(np.abs((normals * normals).sum(axis=1) - 1.0) > normals_tolerance)
+        if bad_normals:
+            data['normals_normalized'] = False
+            if expect_normals_normalized:
+                errors.append("error at %s: %d vertex normals not normalized!"%(path, bad_normals))
+
+    if len(faces):
+        if check_face_index_bounds:
+            data['min_face_index'] = min(data['min_face_index'], int(faces.min()))
+            data['max_face_index'] = max(data['max_face_index'], int(faces.max()))
+
+        valid = np.ones(len(face_sizes), dtype=bool)
+        if expect_face_count:
+            valid = face_sizes == expect_face_count
+            if not valid.all():
+                errors.append("error at %s: %d faces with invalid face count, expected %s!"%(
+                    path, np.count_nonzero(~valid), expect_face_count))
+
+        if expect_consistent_face_count and valid.any():
+            sizes = face_sizes[valid]
+            if data['face_count'] is None:
+                data['face_count'] = int(sizes[0])
+            mismatched = np.count_nonzero(sizes != data['face_count'])
+            if mismatched:
+                errors.append("error at %s: %d faces with mismatched face count (expected %s)"%(
+                    path, mismatched, data['face_count']))
+    return errors
+
+def check_face_bounds (data, num_verts):
+    """ Consistency check on data['min_face_index'] / data['max_face_index'] (same bounds as read_obj) """
+    errors = []
+    if data['min_face_index'] < 0 and abs(data['min_face_index']) >= num_verts * 3:
+        errors.append("min face index %s out of bounds! (%s verts)"%(
+            data['min_face_index'], num_verts))
+
+    if data['max_face_index'] >= num_verts * 3:
+        errors.append("max face index %s out of bounds! (%s verts)"%(
+            data['max_face_index'], num_verts))
+    return errors
+
+def read_obj_arrays (path, check_face_index_bounds = True, cache = None, block_size = None, **kwargs):
+    """ Reads the whole file at once + parses it w/ numpy (see parse_obj_arrays).
+    path may also be a binary file-like object (eg. ShapenetZipArchive.open(...)), which is parsed
+    in blocks of block_size bytes while it's being read (see iter_obj_stream_blocks).
+
+    Returns data, errors w/ the same fields + validation results as read_obj, except that
+        data['verts']:      N x 3 float32 array
+        data['normals']:    M x 3 float32 array
+        data['faces']:      flat int32 array of face indices. May be negative.
+        data['face_sizes']: int32 array w/ the # of indices in each face
+
+    Takes the same kwargs as read_obj / parse_obj_line.
+    If cache (a mesh_cache.MeshCache) is given, parsed arrays are stored in / memory-mapped from it
+    (files only; file-like objects are never cached).
+    """
+    if cache is not None and not is_file_object(path):
+        return cache.read(path, read_obj_arrays, check_face_index_bounds=check_face_index_bounds, **kwargs)
+
+    data, errors = parse_obj_arrays(path, check_face_index_bounds, block_size, **kwargs)
+    data['verts']   = np.ascontiguousarray(data['verts'], dtype=np.float32)
+    data['normals'] = np.ascontiguousarray(data['normals'], dtype=np.float32)
+    data['faces']   = np.ascontiguousarray(data['faces'], dtype=np.int32)
+    return data, errors
+
+def parse_obj_arrays (path, check_face_index_bounds = True, block_size = None, **kwargs):
+    """ The vectorized .obj reader behind read_obj + read_obj_arrays: returns data, errors like read_obj_arrays,
+    but w/ verts + normals as float64 and faces as int64 arrays (ie. the values read_obj would parse) """
+    data = {
+        'min_face_index': 0, 'max_face_index': 0, 'face_count': None,
+        'verts_normalized': True, 'normals_normalized': True,
+    }
+    if not is_file_object(path):
+        with open(path, 'rb') as f:
+            buf = f.read()
+
+    try:
+        if is_file_object(path):
+            verts, normals, faces, face_sizes = concat_obj_blocks(
+                iter_obj_stream_blocks(path, block_size or DEFAULT_BLOCK_SIZE))
+        else:
+            verts, normals, faces, face_sizes = parse_obj_buffer(buf)
+    except Exception as e:
+        verts, normals = np.zeros((0, 3)), np.zeros((0, 3))
+        faces, face_sizes = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32)
+        errors = [ "error at %s: %s"%(source_name(path), e) ]
+    else:
+        errors = validate_obj_arrays(source_name(path), data, verts, normals, faces, face_sizes,
+            check_face_index_bounds=check_face_index_bounds, **kwargs)
+
+    if check_face_index_bounds:
+        errors += check_face_bounds(data, len(verts))
+
+    data['verts']      = verts
+    data['normals']    = normals
+    data['faces']      = faces
+    data['face_sizes'] = face_sizes
+    return data, (errors or None)
+
+
+#
+# Streaming (mmap) .obj reader, for files too large to hold in memory
+#
+
+DEFAULT_BLOCK_SIZE = 1 << 24
+
+def reset_peak_rss ():
+    """ resets the peak RSS of this process (linux only), so peak_rss() measures from here on.
+    Returns False if that isn't supported """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def peak_rss ():
+    """ returns the peak resident set size of this process, in bytes (since the last reset_peak_rss() on linux,
+    otherwise over the process' lifetime), or None if it can't be measured (eg. on windows) """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+def iter_obj_blocks (path, block_size = DEFAULT_BLOCK_SIZE):
+    """ Memory-maps an .obj file and yields it as a sequence of parsed blocks of ~block_size bytes
+    (split on line boundaries), as (verts, normals, faces, face_sizes) arrays (see parse_obj_buffer).
+
+    Face indices are never rebased, so they index into the full vertex list, not the block.
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            start, size = 0, len(buf)
+            while start < size:
+                end = min(start + block_size, size)
+                if end < size:
+                    newline = buf.rfind(b'\n', start, end)
+                    end = newline + 1 if newline >= 0 else buf.find(b'\n', end) + 1 or size
+                yield parse_obj_buffer(buf[start:end])
+                start = end
+
+def iter_obj_stream_blocks (f, block_size = DEFAULT_BLOCK_SIZE):
+    """ Same as iter_obj_blocks, but reads from a binary file-like object (eg. a zip archive member),
+    so each block is parsed while the rest of the file is still being read / decompressed. """
+    tail = b''
+    while True:
+        chunk = f.read(block_size)
+        if not chunk:
+            break
+        buf = tail + chunk
+        newline = buf.rfind(b'\n')
+        if newline < 0:
+            tail = buf
+            continue
+        tail = buf[newline + 1:]
+        yield parse_obj_buffer(buf[:newline + 1])
+    if tail:
+        yield parse_obj_buffer(tail)
+
+def concat_obj_blocks (blocks):
+    """ joins parsed blocks (see iter_obj_blocks) into one set of (verts, normals, faces, face_sizes) """
+    blocks = list(blocks)
+    if not blocks:
+        return parse_obj_buffer(b'')
+    return tuple(np.concatenate(arrays) for arrays in zip(*blocks))
+
+def scan_obj (path, block_size = DEFAULT_BLOCK_SIZE, check_face_index_bounds = True, **kwargs):
+    """ Runs the same checks as read_obj / read_obj_arrays over an .obj file in constant memory
+    (see iter_obj_blocks), without keeping any of the vertices or faces around.
+
+    Returns data, errors w/ the validation fields of read_obj, plus
+        data['num_verts'], data['num_normals'], data['num_faces']
+        data['bounds']:     (min xyz, max xyz) of all vertices, or None if there are none
+        data['topology']:   topology fingerprint (same as topology_fingerprint(read_obj_arrays(path)))
+        data['time']:       seconds taken
+        data['peak_rss']:   peak RSS (bytes) during the scan, or of the process so far where that can't be
+                            reset (see peak_rss; data['peak_rss_scope'] is 'scan' or 'process'), or None
+    """
+    peak_rss_scope = 'scan' if reset_peak_rss() else 'process'
+    t0 = time()
+    data = {
+        'min_face_index': 0, 'max_face_index': 0, 'face_count': None,
+        'verts_normalized': True, 'normals_normalized': True,
+        'num_verts': 0, 'num_normals': 0, 'num_faces': 0,
+        'bounds': None,
+    }
+    errors = []
+    topology = hashlib.sha1()
+    try:
+        for verts, normals, faces, face_sizes in iter_obj_blocks(path, block_size):
+            topology.update(faces.astype('<i4').tobytes())
+            errors += validate_obj_arrays(path, data, verts, normals, faces, face_sizes,
+                check_face_index_bounds=check_face_index_bounds, **kwargs)
+            if len(verts):
+                lo, hi = verts.min(axis=0), verts.max(axis=0)
+                if data['bounds'] is not None:
+                    lo, hi = np.minimum(lo, data['bounds'][0]), np.maximum(hi, data['bounds'][1])
+                data['bounds'] = (lo, hi)
+            data['num_verts']   += len(verts)
+            data['num_normals'] += len(normals)
+            data['num_faces']   += len(face_sizes)
+    except Exception as e:
+        errors.append("error at %s: %s"%(path, e))
+
+    if check_face_index_bounds:
+        errors += check_face_bounds(data, data['num_verts'])
+
+    topology.update(b'%d verts'%data['num_verts'])
+    data['topology'] = topology.hexdigest()
+    data['time'] = time() - t0
+    data['peak_rss'] = peak_rss()
+    data['peak_rss_scope'] = peak_rss_scope
+    return data, (errors or None)
+
+
 def objs_have_same_topology (obj1data, obj2data):
     # print(obj1data, obj2data)
-    return obj1data['faces'] == obj2data['faces']
+    return np.array_equal(obj1data['faces'], obj2data['faces'])
 
 def obj_is_normalized (objdata):
     return objdata['verts_normalized']
 
+def topology_fingerprint (objdata):
+    """ digest of an obj's face index array + vertex count;
+    objs w/ the same fingerprint have the same topology (see objs_have_same_topology) """
+    digest = hashlib.sha1(np.asarray(objdata['faces'], dtype='<i4').tobytes())
+    digest.update(b'%d verts'%len(objdata['verts']))
+    return digest.hexdigest()
+
 def validate_data_samples (*objpaths, **kwargs):
-    objdata = []
+    """ Checks that a set of .obj files all have normalized vertices + the same topology.
 
-    normals_valid, topology_valid = True, True
+    Each file is checked in one streaming pass (see scan_obj) that only keeps its
+    topology fingerprint, and files are grouped by fingerprint, so this runs in
+    constant memory per file and reports every topology class.
+
+    Returns { topology fingerprint: [ paths ] }
+    """
+    topology_groups = {}
+
+    normals_valid = True
     for path in objpaths:
         print("Loading '%s'"%path)
-        obj, errors = read_obj(path, expect_verts_normalized = False, **kwargs)
+        obj, errors = scan_obj(path, expect_verts_normalized = False, **kwargs)
         if errors:
             raise Exception("Failed to read '%s' (%d errors):\n\t%s"%(
                 path, len(errors), '\n\t'.join(errors)))
         if not obj_is_normalized(obj):
             normals_valid = False
             print("'%s' does not have normalized vertices!"%path)
-        objdata.append((obj, path))
+        topology_groups.setdefault(obj['topology'], []).append(path)
 
-    obj1, obj1path = objdata[0]
-    for obj2, obj2path in objdata[1:]:
-        if not objs_have_same_topology(obj1, obj2):
-            topology_valid = False
-            print("'%s', '%s' have different topology"%(obj1path, obj2path))
+    topology_valid = len(topology_groups) <= 1
+    if not topology_valid:
+        print("Found %s topology classes:"%len(topology_groups))
+        for fingerprint, paths in sorted(topology_groups.items(), key=lambda item: -len(item[1])):
+            print("\t%s: %s files (eg. '%s')"%(fingerprint, len(paths), paths[0]))
 
     print("Validation %s"%("successful" if normals_valid and topology_valid else "failed"))
     print("\thave matching topology: %s"%topology_valid)
     print("\tvertices are normalized: %s"%normals_valid)
+    return topology_groups
 
-def obj_extract_params (objdata):
-    corners = objdata['verts'][:8]
-    print("Corners:")
-    sign = [ '-', '+' ]
-    for i, verts in enumerate(corners):
-        print("%sx %sy %sz: %s"%(
-            sign[i & 1], sign[(i >> 1) & 1], sign[(i >> 2) & 1],
-            verts
-        ))
-    print("%s remaining vertices"%(len(objdata['verts'][8:])))
+def obj_extract_params (objdata, verbose = False):
+    if verbose:
+        corners = objdata['verts'][:8]
+        print("Corners:")
+        sign = [ '-', '+' ]
+        for i, verts in enumerate(corners):
+            print("%sx %sy %sz: %s"%(
+                sign[i & 1], sign[(i >> 1) & 1], sign[(i >> 2) & 1],
+                verts
+            ))
+        print("%s remaining vertices"%(len(objdata['verts'][8:])))
 
     # plane_verts = [
     #     (dir, [ corner for i, corner in enumerate(corners)
@@ -203,6 +649,8 @@ def obj_extract_params (objdata):
     #                 ))))
 
     def flatten (array):
+        if isinstance(array, np.ndarray):
+            return array.ravel().tolist()
         output = []
         for elem in array:
             output += list(elem)
@@ -218,16 +666,164 @@ def locate_obj_files_in_directory (path):
         if file.endswith('.obj')
     ]
 
+def param_name (path, directory = None):
+    """ dataset key for an .obj file: its path relative to directory (or its filename), w/out extension """
+    if directory:
+        path = os.path.relpath(path, directory)
+    else:
+        path = os.path.split(path)[1]
+    return path.split('.')[0]
+
+# first line written by each shrinkwrap backend's .obj exporter (see obj_shrinkwrap_backend)
+SHRINKWRAP_OBJ_HEADERS = { 'numpy': '# numpy_shrinkwrap', 'blender': '# Blender' }
+
+def obj_shrinkwrap_backend (path):
+    """ returns the shrinkwrap backend ('numpy' or 'blender') that exported an .obj file (from its first line),
+    or None for other .obj files """
+    with open(path, 'rb') as f:
+        line = f.readline().decode('utf-8', 'replace')
+    for backend, header in SHRINKWRAP_OBJ_HEADERS.items():
+        if line.startswith(header):
+            return backend
+    return None
+
+def extract_params_task (task):
+    """ extract_params worker: parses one .obj file, returning
+    (path, params or None, errors, content hash, mesh stats (see mesh_stats.compute_mesh_stats),
+    mesh cache (hits, misses, evictions) for this file, if kwargs has a cache, shrinkwrap backend
+    (see obj_shrinkwrap_backend)) """
+    path, kwargs = task
+    cache = kwargs.get('cache')
+    cache_counts = cache.counts() if cache is not None else None
+    objdata, errors = read_obj_arrays(path, expect_verts_normalized=False, **kwargs)
+    stats = dict(compute_mesh_stats(objdata, normals_tolerance=kwargs.get('normals_tolerance', DEFAULT_NORMALS_TOLERANCE)),
+        topology=topology_fingerprint(objdata))
+    if cache is not None:
+        cache_counts = tuple(after - before for after, before in zip(cache.counts(), cache_counts))
+    if errors:
+        return path, None, errors, hash_file(path), stats, cache_counts, obj_shrinkwrap_backend(path)
+    return path, obj_extract_params(objdata), None, hash_file(path), stats, cache_counts, obj_shrinkwrap_backend(path)
+
+EXTRACT_MANIFEST_VERSION = 4
+
+def extract_manifest_path (export_path):
+    return export_path + '.manifest.json'
+
+def extract_stats_path (export_path):
+    return export_path + '.stats.npz'
+
+def extract_faces_path (export_path):
+    return export_path + '.faces.npz'
+
+def save_dataset_faces (export_path, fingerprints, read_faces):
+    """ Params are vertex positions only, so the faces of a dataset whose rows all share the same topology
+    (eg. shrinkwrap exports, which are all the same subdivided cube) are written once, to
+    <export_path>.faces.npz (see load_dataset_faces), instead of being kept w/ each model.
+
+    fingerprints are the topology fingerprints of every row (see topology_fingerprint), and
+    read_faces() returns the parsed (read_obj_arrays) data of any one of them.
+    Returns True if the faces were written; stale faces are removed if the rows don't all match.
+    """
+    path = extract_faces_path(export_path)
+    fingerprints = set(fingerprints)
+    if len(fingerprints) != 1 or None in fingerprints:
+        if len(fingerprints) > 1:
+            print("Rows have %s different topologies, not writing shared faces"%len(fingerprints))
+        if os.path.exists(path):
+            os.remove(path)
+        return False
+    data = read_faces()
+    with open(path, 'wb') as f:
+        np.savez(f, topology=np.array(fingerprints.pop()), num_verts=np.array(len(data['verts'])),
+            faces=data['faces'], face_sizes=data['face_sizes'])
+    print("Saved shared faces (%s faces) to '%s'"%(len(data['face_sizes']), path))
+    return True
+
+def load_dataset_faces (export_path):
+    """ returns the faces shared by every row of a dataset (see save_dataset_faces), as
+    { 'faces', 'face_sizes', 'num_verts', 'topology' }, or None if they aren't shared """
+    path = extract_faces_path(export_path)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return {
+            'faces': data['faces'], 'face_sizes': data['face_sizes'],
+            'num_verts': int(data['num_verts']), 'topology': str(data['topology']),
+        }
+
+def extract_manifest_options (kwargs):
+    """ the read_obj_arrays options that affect extract_params outputs (recorded in the manifest) """
+    return {
+        key: value for key, value in sorted(kwargs.items())
+        if isinstance(value, (bool, int, float, str, type(None)))
+    }
+
+def load_extract_manifest (export_path, options):
+    """ returns the { abspath: source record } manifest of a previous extract_params run,
+    or {} if there isn't a usable one (missing, or written w/ different options) """
+    manifest_path = extract_manifest_path(export_path)
+    if not os.path.exists(manifest_path) or not os.path.exists(export_path):
+        return {}
+    try:
+        manifest = deserialize_object(manifest_path)
+    except ValueError:
+        return {}
+    if manifest.get('version') != EXTRACT_MANIFEST_VERSION or manifest.get('options') != options:
+        print("Manifest '%s' is out of date, re-extracting everything"%manifest_path)
+        return {}
+    return manifest['sources']
+
+def partition_changed_sources (objpaths, sources):
+    """ splits objpaths into (unchanged, changed) w/ respect to a manifest's source records.
+    Files are unchanged if their size + mtime match; if only the mtime changed, the content hash decides.
+    Returns { abspath: source record } for unchanged files, and a list of paths to re-parse.
+    """
+    unchanged, changed = {}, []
+    for path in objpaths:
+        key = os.path.abspath(path)
+        stat = os.stat(path)
+        source = sources.get(key)
+        if source and source['size'] == stat.st_size and (
+                source['mtime'] == stat.st_mtime or source['hash'] == hash_file(path)):
+            unchanged[key] = dict(source, mtime=stat.st_mtime)
+        else:
+            changed.append(path)
+    return unchanged, changed
+
 def extract_params (
         directory = None,
         files = None,
         export_path = None,
+        num_processes = None,
+        chunksize = 16,
+        progress_interval = 1.0,
+        incremental = True,
         **kwargs):
+    """ Extracts params from a set of .obj files (see obj_extract_params), parsing them
+    across a process pool, and writes them out as one consolidated dataset:
+    a { name: params } dict, serialized to export_path (.pkl, .json, .json.zip, etc),
+    or a memory-mapped .pds file (see serialization_utils.ParamDataset), written row by row.
+
+    Dataset keys are the .obj paths relative to directory (or the file names), w/out extension.
+    kwargs are forwarded to read_obj_arrays.
+
+    Mesh stats + validation checks for every file (see mesh_stats.compute_mesh_stats) are
+    computed while parsing, and written as one columnar table to <export_path>.stats.npz.
+    If every row has the same topology, their faces are written once, to <export_path>.faces.npz
+    (see save_dataset_faces).
 
+    If incremental, a manifest of every source file (path, size, mtime, content hash, output name)
+    is kept next to export_path (<export_path>.manifest.json), and later runs only re-parse new or
+    changed files, carrying over the other outputs + dropping outputs whose source disappeared.
+
+    Shrinkwrap exports from the numpy + blender backends have different vertex orders (see
+    numpy_shrinkwrap.subdivide), so their params don't line up: datasets that would mix both
+    (including w/ rows carried over from a previous run) are rejected.
+    """
     objpaths = files or []
     if directory:
         objpaths += locate_obj_files_in_directory(directory)
-    objpaths = set(objpaths)
+    objpaths = sorted(set(objpaths))
 
     if not objpaths:
         raise Exception("No input files! (objdir = %s, objpaths = %s)"%(directory, files))
@@ -235,22 +831,287 @@ def extract_params (
     if export_path is None:
         raise Exception("Missing export path!")
 
-    if not os.path.exists(export_path):
-        os.makedirs(export_path)
+    if not os.path.splitext(export_path)[1]:
+        export_path += '.pkl'
 
-    for i, path in enumerate(objpaths):
-        print("Loading '%s'"%path)
-        objdata, errors = read_obj(path, expect_verts_normalized=False, **kwargs)
-        if errors:
-            print("Failed to load '%s' (%d errors):\n\t%s"%(
-                path, len(errors), '\n\t'.join(errors)))
+    options = extract_manifest_options(kwargs)
+    sources = load_extract_manifest(export_path, options) if incremental else {}
+    current = set(os.path.abspath(path) for path in objpaths)
+    removed = [ key for key in sources if key not in current ]
+    unchanged, objpaths = partition_changed_sources(objpaths, sources)
+    if sources:
+        print("%s unchanged, %s new or changed, %s removed files since the last run"%(
+            len(unchanged), len(objpaths), len(removed)))
+    if sources and not objpaths and not removed:
+        print("'%s' is up to date"%export_path)
+        return deserialize_object(export_path)
+
+    previous = deserialize_object(export_path) if unchanged else None
+
+    num_processes = num_processes or multiprocessing.cpu_count()
+    print("Extracting params from %s files (%s processes)"%(len(objpaths), num_processes))
+
+    t0 = time()
+    tasks = [ (path, kwargs) for path in objpaths ]
+    if num_processes > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(num_processes)
+        results = pool.imap_unordered(extract_params_task, tasks, chunksize)
+    else:
+        pool = None
+        results = map(extract_params_task, tasks)
+
+    # outputs are written to a temp file + renamed into place, since the previous dataset may still be read from.
+    # .pds datasets are streamed straight to disk; everything else is collected + serialized at the end
+    basedir, filename = os.path.split(export_path)
+    partial_path = os.path.join(basedir, '_partial_' + filename)
+    if export_path.endswith('.pds'):
+        dataset, writer = None, ParamDatasetWriter(partial_path)
+    else:
+        dataset, writer = {}, None
+
+    def write_output (name, params):
+        if writer:
+            writer.write(name, params)
         else:
-            data = obj_extract_params(objdata)
-            filename = os.path.split(path)[1].split('.')[0]
-            output_path = os.path.join(export_path, filename + '.json')
-            # output_path = os.path.join(export_path, filename + '.pkl')
-            serialize_object(output_path, data)
-            print("Done: %d / %d"%(i + 1, len(objpaths)))
+            dataset[name] = params
+
+    failed = 0
+    last_progress = t0
+    try:
+        for source in unchanged.values():
+            if source['name'] is not None:
+                write_output(source['name'], previous[source['name']])
+
+        for i, (path, params, errors, digest, stats, cache_counts, backend) in enumerate(results):
+            if pool and cache_counts is not None:
+                kwargs['cache'].add_counts(*cache_counts)       # pool workers update their own copies of the cache
+            stat = os.stat(path)
+            source = unchanged[os.path.abspath(path)] = {
+                'size': stat.st_size, 'mtime': stat.st_mtime, 'hash': digest, 'name': None, 'stats': stats,
+                'backend': backend,
+            }
+            if not errors:
+                try:
+                    write_output(param_name(path, directory), params)
+                    source['name'] = param_name(path, directory)
+                except Exception as e:
+                    errors = [ str(e) ]
+            if errors:
+                failed += 1
+                print("Failed to load '%s' (%d errors):\n\t%s"%(
+                    path, len(errors), '\n\t'.join(errors)))
+
+            if time() - last_progress >= progress_interval or i + 1 == len(tasks):
+                last_progress = time()
+                print("Done: %d / %d (%d failed, %0.1f files / sec)"%(
+                    i + 1, len(tasks), failed, (i + 1) / max(last_progress - t0, 1e-9)))
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+        if writer:
+            writer.close()
+
+    backends = {}
+    for key, source in sorted(unchanged.items()):
+        if source['name'] is not None and source.get('backend'):
+            backends.setdefault(source['backend'], []).append(key)
+    if len(backends) > 1:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise Exception("Can't mix shrinkwrap backends in one dataset (their vertex orders differ): %s"%(
+            ', '.join("%s %s exports (eg. '%s')"%(len(keys), backend, keys[0]) for backend, keys in sorted(backends.items()))))
+
+    if writer:
+        print("Saved %s rows to '%s'"%(len(writer.names), export_path))
+    else:
+        serialize_object(partial_path, dataset)
+    previous = None
+    os.replace(partial_path, export_path)
+
+    stats_paths = sorted(key for key, source in unchanged.items() if source.get('stats'))
+    stats_table = build_stats_table(
+        [ unchanged[key]['name'] or param_name(key, directory and os.path.abspath(directory)) for key in stats_paths ],
+        [ unchanged[key]['stats'] for key in stats_paths ])
+    save_stats_table(extract_stats_path(export_path), stats_table)
+    summarize_stats_table(stats_table)
+
+    named = [ (key, source) for key, source in sorted(unchanged.items()) if source['name'] is not None ]
+    save_dataset_faces(export_path,
+        [ (source.get('stats') or {}).get('topology') for key, source in named ],
+        lambda: read_obj_arrays(named[0][0], check_face_index_bounds=False)[0])
+
+    if incremental:
+        serialize_object(extract_manifest_path(export_path), {
+            'version': EXTRACT_MANIFEST_VERSION,
+            'options': options,
+            'sources': unchanged,
+        })
+    return dataset if dataset is not None else deserialize_object(export_path)
+
+
+#
+# Param extraction straight from a (shapenet) zip archive, w/out extracting anything to disk
+#
+
+def read_archive_obj (archive_path, member, **kwargs):
+    """ parses an .obj member (a zip_index row) of a zip archive w/ read_obj_arrays,
+    decompressing + parsing it block by block (from a memory map of the archive shared by each process) """
+    with archive_map(archive_path).open(member) as f:
+        return read_obj_arrays(f, **kwargs)
+
+def archive_obj_task (task):
+    func, archive_path, member, kwargs = task
+    return member, func(archive_path, member, **kwargs)
+
+def iter_archive_objs (archive_path, synsets = None, func = read_archive_obj,
+        num_processes = None, chunksize = 4, **kwargs):
+    """ Parallel iterator over the .obj members of a zip archive, listed from its member index
+    (see zip_index.ZipMemberIndex). Each worker reads members straight from the archive.
+
+    Yields (member, func(archive_path, member, **kwargs)) for every .obj file in synsets (or the whole
+    archive), in completion order. func defaults to read_archive_obj, ie. yields (member, (data, errors)).
+
+    Usage:
+        for member, (data, errors) in iter_archive_objs('ShapeNetCore.v2.zip', [ '02958343' ]):
+            ...
+    """
+    index = ZipMemberIndex(archive_path)
+    try:
+        if not index.is_current():
+            index.build()
+        members = [
+            dict(member)
+            for synset in (synsets or [ None ])
+            for member in index.members(synset=synset, kinds=[ 'obj' ])
+        ]
+    finally:
+        index.close()
+
+    tasks = [ (func, archive_path, member, kwargs) for member in members ]
+    num_processes = num_processes or multiprocessing.cpu_count()
+    if num_processes == 1 or len(tasks) <= 1:
+        yield from map(archive_obj_task, tasks)
+        return
+    pool = multiprocessing.Pool(num_processes)
+    try:
+        yield from pool.imap_unordered(archive_obj_task, tasks, chunksize)
+    finally:
+        pool.close()
+        pool.join()
+
+def archive_param_name (member):
+    """ dataset key for an archive .obj member: <synsetId>/<modelId> """
+    return '%s/%s'%(member['synset'], member['model'])
+
+def extract_archive_params_task (archive_path, member, **kwargs):
+    """ extract_archive_params worker: returns (params or None, errors, mesh stats) for one .obj member """
+    objdata, errors = read_archive_obj(archive_path, member, expect_verts_normalized=False, **kwargs)
+    stats = dict(compute_mesh_stats(objdata, normals_tolerance=kwargs.get('normals_tolerance', DEFAULT_NORMALS_TOLERANCE)),
+        topology=topology_fingerprint(objdata))
+    if errors:
+        return None, errors, stats
+    return obj_extract_params(objdata), None, stats
+
+def extract_archive_params (
+        archive_path,
+        export_path,
+        synsets = None,
+        num_processes = None,
+        chunksize = 4,
+        progress_interval = 1.0,
+        **kwargs):
+    """ Same as extract_params, but reads the .obj files straight out of a (shapenet) zip archive:
+    members are decompressed + parsed in parallel (see iter_archive_objs), and never written to disk.
+
+    Dataset keys are <synsetId>/<modelId>. Only synsets (a list of synsetIds) are read, if given.
+    Writes the same dataset + <export_path>.stats.npz (+ .faces.npz) outputs as extract_params (no manifest: the archive
+    is read-only, so there's nothing to update incrementally).
+    """
+    if not os.path.splitext(export_path)[1]:
+        export_path += '.pkl'
+
+    basedir, filename = os.path.split(export_path)
+    partial_path = os.path.join(basedir, '_partial_' + filename)
+    if export_path.endswith('.pds'):
+        dataset, writer = None, ParamDatasetWriter(partial_path)
+    else:
+        dataset, writer = {}, None
+
+    t0 = last_progress = time()
+    names, stats_rows, written = [], [], []
+    failed = 0
+    try:
+        for i, (member, (params, errors, stats)) in enumerate(iter_archive_objs(
+                archive_path, synsets, extract_archive_params_task, num_processes, chunksize, **kwargs)):
+            name = archive_param_name(member)
+            names.append(name)
+            stats_rows.append(stats)
+            if not errors:
+                try:
+                    if writer:
+                        writer.write(name, params)
+                    else:
+                        dataset[name] = params
+                    written.append((member, stats['topology']))
+                except Exception as e:
+                    errors = [ str(e) ]
+            if errors:
+                failed += 1
+                print("Failed to load '%s' (%d errors):\n\t%s"%(
+                    member['path'], len(errors), '\n\t'.join(errors)))
+
+            if time() - last_progress >= progress_interval:
+                last_progress = time()
+                print("Done: %d (%d failed, %0.1f files / sec)"%(
+                    i + 1, failed, (i + 1) / max(last_progress - t0, 1e-9)))
+    finally:
+        if writer:
+            writer.close()
+
+    if not names:
+        raise Exception("No .obj files found in '%s' (synsets = %s)"%(archive_path, synsets))
+
+    print("Extracted params from %d files (%d failed) in %0.1fs"%(len(names), failed, time() - t0))
+    if writer:
+        print("Saved %s rows to '%s'"%(len(writer.names), export_path))
+    else:
+        serialize_object(partial_path, dataset)
+    os.replace(partial_path, export_path)
+
+    stats_table = build_stats_table(names, stats_rows)
+    save_stats_table(extract_stats_path(export_path), stats_table)
+    summarize_stats_table(stats_table)
+    save_dataset_faces(export_path, [ topology for member, topology in written ],
+        lambda: read_archive_obj(archive_path, written[0][0], check_face_index_bounds=False)[0])
+    return dataset if dataset is not None else deserialize_object(export_path)
+
+PARITY_SAMPLES = {
+    'plain':            b'v 0 0 0\nv 1 0 0\nv 0 1 0\nv 0 0 1\nf 1 2 3\nf 1 3 4\n',
+    'v/vt/vn':          b'v 0 0 0\nv 1 0 0\nv 0 1 0\nvn 0 0 1\nf 1/1/1 2/2/1 3/3/1\nf 3/1/1 2/2/1 1/3/1\n',
+    'v//vn':            b'v 0 0 0\nv 1 0 0\nv 0 1 0\nvn 0 0 1\nf 1//1 2//1 3//1\n',
+    'plain, then v/vt': b'v 0 0 0\nv 1 0 0\nv 0 1 0\nv 0 0 1\nf 1 2 3\nf 1/1 2/1 3/1 4/1\n',
+    'v/vt/vn + v/vt':   b'v 0 0 0\nv 1 0 0\nv 0 1 0\nvn 0 0 1\nf 1/1/1 2/2/1 3/3/1\nf 3/1 2/2 1/3\n',
+    'mixed in a face':  b'v 0 0 0\nv 1 0 0\nv 0 1 0\nv 0 0 1\nf 1 2/1/1 3/1\nf 4/1/1 1 2//1\n',
+}
+
+def check_reader_parity (samples = PARITY_SAMPLES):
+    """ checks that read_obj + read_obj_arrays parse the same verts, normals + face indices as read_obj_lines,
+    for a set of sample .obj texts (see PARITY_SAMPLES). Returns a list of errors (empty if they all match) """
+    errors = []
+    kwargs = dict(check_verts_normalized=False, check_normals_normalized=False, expect_consistent_face_count=False)
+    for name, text in samples.items():
+        expected, _ = read_obj_lines(io.BytesIO(text), **kwargs)
+        if read_obj(io.BytesIO(text), **kwargs) != (expected, None):
+            errors.append("%s: read_obj = %s, expected %s"%(name, read_obj(io.BytesIO(text), **kwargs), expected))
+        data, _ = read_obj_arrays(io.BytesIO(text), **kwargs)
+        for key in ('verts', 'normals', 'faces'):
+            if np.asarray(data[key]).ravel().tolist() != np.asarray(expected[key], dtype=np.float64).ravel().tolist():
+                errors.append("%s: %s = %s, expected %s"%(name, key, np.asarray(data[key]).ravel().tolist(), expected[key]))
+        lines = [ line for line in text.split(b'\n') if line.startswith(b'f ') ]
+        if data['face_sizes'].tolist() != [ len(line.split()) - 1 for line in lines ]:
+            errors.append("%s: face sizes = %s"%(name, data['face_sizes'].tolist()))
+    return errors
 
 if __name__ == '__main__':
     # validate_data_samples(
@@ -269,11 +1130,37 @@ if __name__ == '__main__':
     #     check_normals_normalized=False,
     # )
 
-    if len(sys.argv) < 3:
-        print("Usage: %s <directory-containing-obj-files> <export-path>"%sys.argv[0])
+    if len(sys.argv) == 2 and sys.argv[1] == '--check-parity':
+        errors = check_reader_parity()
+        for error in errors:
+            print("Error: %s"%error)
+        print("OK" if not errors else "%s errors"%len(errors))
+        sys.exit(1 if errors else 0)
+    elif len(sys.argv) >= 3 and sys.argv[1] == '--scan':
+        for path in sys.argv[2:]:
+            data, errors = scan_obj(path, expect_verts_normalized=False, check_normals_normalized=False)
+            print("%s: %s verts, %s faces, %s errors (scanned in %0.2fs, %s)"%(
+                path, data['num_verts'], data['num_faces'], len(errors or []), data['time'],
+                'peak rss %0.1f MB (%s)'%(data['peak_rss'] / 1e6, data['peak_rss_scope'])
+                if data['peak_rss'] is not None else 'peak rss unavailable'))
+            for error in errors or []:
+                print("\t%s"%error)
+    elif len(sys.argv) >= 4 and sys.argv[1] == '--archive':
+        extract_archive_params(
+            archive_path = sys.argv[2],
+            export_path = sys.argv[3],
+            synsets = sys.argv[4:] or None,
+            check_normals_normalized = False
+        )
+    elif len(sys.argv) < 3:
+        print("Usage: %s <directory-containing-obj-files> <export-file> [<num-processes>]"%sys.argv[0])
+        print("       %s --archive <shapenet-zip> <export-file> [<synset-ids...>]"%sys.argv[0])
+        print("       %s --scan <obj-files...>"%sys.argv[0])
+        print("       %s --check-parity"%sys.argv[0])
     else:
         extract_params(
             directory = sys.argv[1],
             export_path = sys.argv[2],
+            num_processes = int(sys.argv[3]) if len(sys.argv) > 3 else None,
             check_normals_normalized = False
         )
@@ -1,19 +1,22 @@
 #!/usr/bin/env python
+import os
 import sys
 import platform
 import subprocess
 
 WIN_BLENDER_INSTALL_PATH = 'blender'        # Set this if you're a windows user
 
-def run_blender_script (script, *args):
-    """ Runs a blender script from the commandline using the user's blender install """
-
+def blender_command (script, *args):
+    """ the command to run a blender script (in the background) w/ the user's blender install """
     if platform.system().lower() == 'windows':
         blender_path = WIN_BLENDER_INSTALL_PATH
     else:
         blender_path = 'blender'
+    return [ blender_path, '-b', '-P', script ] + list(args)
 
-    command = [ blender_path, '-b', '-P', script ] + list(args)
+def run_blender_script (script, *args):
+    """ Runs a blender script from the commandline using the user's blender install """
+    command = blender_command(script, *args)
     try:
         subprocess.run(command)
     except FileNotFoundError:
@@ -32,6 +35,22 @@ def run_blender_script (script, *args):
         """)%(' '.join(command), command[0]))
 
 
+SHRINKWRAP_BACKENDS = ('blender', 'numpy')
+
+def select_backend (argv, default = 'blender', backends = SHRINKWRAP_BACKENDS):
+    """ picks the shrinkwrap backend (one of backends, ie. 'blender' or 'numpy') from a --backend=<name> argument,
+    or the SHRINKWRAP_BACKEND environment variable. Returns (backend, argv w/out --backend) """
+    backend = os.environ.get('SHRINKWRAP_BACKEND') or default
+    args = []
+    for arg in argv:
+        if arg.startswith('--backend='):
+            backend = arg[len('--backend='):]
+        else:
+            args.append(arg)
+    if backend not in backends:
+        raise Exception("Unknown shrinkwrap backend '%s' (expected one of %s)"%(backend, backends))
+    return backend, args
+
 def run_self ():
     if not sys.argv[0].endswith('blender'):
         print("Running self with blender: %s"%(' '.join(sys.argv)))
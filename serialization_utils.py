@@ -1,60 +1,411 @@
 import os
+import io
+import bz2
+import gzip
+import lzma
 import pickle
 import json
+import hashlib
+import struct
 import zipfile
+import numpy as np
 from time import time
+from contextlib import contextmanager
 
-def do_file_action (path, mode, action):
-    if path.endswith('.zip'):
-        with zipfile.ZipFile(path, mode.strip('b')) as zfile:
-            with zfile.open(path.strip('.zip'), mode.strip('b')) as f:
-                return action(f)
+#
+# Codecs (how an object is encoded) + compressors (how the encoded stream is stored), picked by file extension:
+#
+#   foo.json        json, uncompressed
+#   foo.pkl.xz      pickle, lzma compressed
+#   foo.npy.gz      numpy array, gzip (deflate) compressed
+#   foo.json.zip    json, stored as the only member of a zip archive
+#
+# Codecs are (write(data, f), read(f)) functions on binary file objects; compressors are
+# open(path, mode, level) context managers returning binary file objects. Both stream,
+# so nothing is encoded into one big in-memory string first.
+#
+
+class JsonEncoder (json.JSONEncoder):
+    """ json encoder that also handles numpy arrays / scalars """
+    def default (self, value):
+        if isinstance(value, np.ndarray):
+            return value.tolist()
+        if isinstance(value, np.generic):
+            return value.item()
+        return super().default(value)
+
+def write_json (data, f):
+    text = io.TextIOWrapper(f, encoding='utf-8')
+    json.dump(data, text, cls=JsonEncoder)
+    text.flush()
+    text.detach()
+
+def read_json (f):
+    return json.load(io.TextIOWrapper(f, encoding='utf-8'))
+
+# plain pickle (protocol 5), so .pkl files stay loadable w/ pickle.load. The pickler writes straight to f,
+# frame by frame, and large buffers (eg. numpy arrays) are written directly from memory, so the stream is
+# never built up in memory.
+def write_pickle (data, f):
+    pickle.dump(data, f, protocol=5)
+
+def read_pickle (f):
+    return pickle.load(f)
+
+def write_npy (data, f):
+    np.lib.format.write_array(f, np.asanyarray(data), allow_pickle=False)
+
+def read_npy (f):
+    return np.lib.format.read_array(f, allow_pickle=False)
+
+CODECS = {
+    'json': (write_json, read_json),
+    'pkl':  (write_pickle, read_pickle),
+    'npy':  (write_npy, read_npy),
+}
+
+@contextmanager
+def open_uncompressed (path, mode, level = None):
+    with open(path, mode) as f:
+        yield f
+
+@contextmanager
+def open_zip (path, mode, level = None):
+    """ stores a file as the only member of a zip archive (ZIP_STORED, or ZIP_DEFLATED if level is set) """
+    if 'r' in mode:
+        with zipfile.ZipFile(path, 'r') as zfile:
+            with zfile.open(zfile.namelist()[0], 'r') as f:
+                yield f
+    else:
+        compression = zipfile.ZIP_STORED if level is None else zipfile.ZIP_DEFLATED
+        with zipfile.ZipFile(path, 'w', compression=compression, compresslevel=level) as zfile:
+            with zfile.open(os.path.basename(path)[:-len('.zip')], 'w', force_zip64=True) as f:
+                yield f
+
+def stdlib_compressor (module, level_arg, default_level):
+    @contextmanager
+    def open_compressed (path, mode, level = None):
+        kwargs = {} if 'r' in mode else { level_arg: default_level if level is None else level }
+        with module.open(path, mode, **kwargs) as f:
+            yield f
+    return open_compressed
+
+COMPRESSORS = {
+    '':    open_uncompressed,
+    'zip': open_zip,
+    'gz':  stdlib_compressor(gzip, 'compresslevel', 6),
+    'xz':  stdlib_compressor(lzma, 'preset', 6),
+    'bz2': stdlib_compressor(bz2, 'compresslevel', 9),
+}
+
+def register_codec (name, write, read):
+    CODECS[name] = (write, read)
+
+def register_compressor (ext, open_compressed):
+    COMPRESSORS[ext] = open_compressed
+
+def parse_format (file):
+    """ returns the (codec, compressor) names for a file, eg. 'a.b.json.xz' => ('json', 'xz') """
+    base, ext = os.path.splitext(file)
+    compressor = ext.lstrip('.')
+    if compressor in COMPRESSORS:
+        file = base
     else:
-        with open(path, mode) as f:
-            # print("opening '%s' with mode '%s'"%(path, mode))
-            return action(f)
+        compressor = ''
+    return os.path.splitext(file)[1].lstrip('.'), compressor
+
+def file_format (file):
+    """ returns the serialization format (codec) of a file from its extension(s), eg. 'a.b.json.zip' => 'json' """
+    return parse_format(file)[0]
+
+class CountingFile (io.RawIOBase):
+    """ binary file wrapper that counts the bytes read / written through it """
+    def __init__ (self, f):
+        self.f = f
+        self.count = 0
+
+    def readable (self):
+        return True
+
+    def writable (self):
+        return True
+
+    def readinto (self, buffer):
+        count = self.f.readinto(buffer)
+        self.count += count or 0
+        return count
+
+    def write (self, data):
+        count = self.f.write(data)
+        self.count += count if count is not None else len(data)
+        return count
+
+    def flush (self):
+        self.f.flush()
 
-def serialize_object (path, data):
+@contextmanager
+def open_counted (path, mode, level = None):
+    """ opens path w/ its compressor; yields (stream, stats) where stats['raw_bytes'] (bytes seen by the
+    codec) and stats['stored_bytes'] (size on disk) are filled in once the stream is closed """
+    codec, compressor = parse_format(os.path.basename(path))
+    stats = {}
+    with COMPRESSORS[compressor](path, mode, level) as f:
+        stream = CountingFile(f)
+        yield stream, stats
+        stream.flush()
+    stats['raw_bytes'] = stream.count
+    stats['stored_bytes'] = os.path.getsize(path)
+
+def format_stats (stats, seconds):
+    return "%0.2f MB -> %0.2f MB on disk (ratio %0.2f), %0.1f MB/s"%(
+        stats['raw_bytes'] / 1e6, stats['stored_bytes'] / 1e6,
+        stats['raw_bytes'] / max(stats['stored_bytes'], 1),
+        stats['raw_bytes'] / 1e6 / max(seconds, 1e-9))
+
+def hash_file (path, block_size = 1 << 20):
+    """ returns the sha1 hex digest of a file's contents """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def serialize_object (path, data, level = None, verbose = True):
+    """ Writes data to path, w/ the codec + compressor picked by its extension (see CODECS, COMPRESSORS).
+    level sets the compression level (where supported). Returns throughput / compression stats.
+    """
     basedir, file = os.path.split(path)
     if basedir and not os.path.exists(basedir):
         os.makedirs(basedir)
 
-    print("Saving '%s'..."%path)
+    if verbose:
+        print("Saving '%s'..."%path)
     t0 = time()
-    actions = {
-        'json': lambda f: f.write(json.dumps(data).encode('utf-8')),
-        'pkl': lambda f: pickle.dump(data, f)
-    }
-    mode = { 'json': 'wb', 'pkl': 'wb' }
-    ext = file.split('.')[1]
-    do_file_action(path, mode[ext], actions[ext])
-    print("OK, saved in %s"%(time() - t0))
-
-def deserialize_object (path):
+    if path.endswith('.pds'):
+        write_param_dataset(path, data.items())
+        if verbose:
+            print("OK, saved in %s"%(time() - t0))
+        return None
+
+    codec, compressor = parse_format(file)
+    if codec not in CODECS:
+        raise Exception("Unknown format '%s' for '%s' (expected one of %s)"%(codec, path, sorted(CODECS)))
+    write, read = CODECS[codec]
+    with open_counted(path, 'wb', level) as (f, stats):
+        write(data, f)
+    stats['seconds'] = time() - t0
+    if verbose:
+        print("OK, saved in %s (%s)"%(stats['seconds'], format_stats(stats, stats['seconds'])))
+    return stats
+
+def deserialize_object (path, verbose = True):
     if not os.path.exists(path):
         raise FileNotFoundError("File does not exist: '%s'"%path)
     basedir, file = os.path.split(path)
 
-    print("Attempting to load '%s'..."%path)
+    if verbose:
+        print("Attempting to load '%s'..."%path)
     t0 = time()
-    actions = {
-        'json': lambda f: json.loads(f.read().decode('utf-8')),
-        'pkl': lambda f: pickle.load(f)
-    }
-    mode = { 'zip': 'rb', 'json': 'rb', 'pkl': 'rb' }
-    ext = file.split('.')[1]
-    result = do_file_action(path, mode[ext], actions[ext])
-    print("OK, loaded in %s"%(time() - t0))
+    if path.endswith('.pds'):
+        result = ParamDataset(path)
+        if verbose:
+            print("OK, loaded in %s"%(time() - t0))
+        return result
+
+    codec, compressor = parse_format(file)
+    if codec not in CODECS:
+        raise Exception("Unknown format '%s' for '%s' (expected one of %s)"%(codec, path, sorted(CODECS)))
+    write, read = CODECS[codec]
+    with open_counted(path, 'rb') as (f, stats):
+        result = read(io.BufferedReader(f))
+    if verbose:
+        seconds = time() - t0
+        print("OK, loaded in %s (%s)"%(seconds, format_stats(stats, seconds)))
     return result
 
+def benchmark_formats (data, formats, directory = '.', level = None):
+    """ Writes + reads data back w/ each format (file extension, eg. '.pkl.xz'),
+    and returns a list of { format, raw_bytes, stored_bytes, ratio, write_mbps, read_mbps } rows """
+    results = []
+    for ext in formats:
+        path = os.path.join(directory, 'benchmark' + ext)
+        stats = serialize_object(path, data, level=level, verbose=False)
+        t0 = time()
+        deserialize_object(path, verbose=False)
+        read_seconds = time() - t0
+        results.append({
+            'format': ext,
+            'raw_bytes': stats['raw_bytes'],
+            'stored_bytes': stats['stored_bytes'],
+            'ratio': stats['raw_bytes'] / max(stats['stored_bytes'], 1),
+            'write_mbps': stats['raw_bytes'] / 1e6 / max(stats['seconds'], 1e-9),
+            'read_mbps': stats['raw_bytes'] / 1e6 / max(read_seconds, 1e-9),
+        })
+        os.remove(path)
+    for row in sorted(results, key=lambda row: row['stored_bytes']):
+        print("%-12s %10.2f MB %10.2f MB  ratio %6.2f  write %8.1f MB/s  read %8.1f MB/s"%(
+            row['format'], row['raw_bytes'] / 1e6, row['stored_bytes'] / 1e6,
+            row['ratio'], row['write_mbps'], row['read_mbps']))
+    return results
+
+#
+# Param dataset (.pds) format: a dense N x D float32 matrix + a name for each row.
+#
+#   header      (PDS_HEADER, see below)
+#   data        N x D float32 (little-endian) at data_offset (page aligned, so it can be memory-mapped)
+#   name index  json list of N row names (utf-8) at index_offset
+#
+
+PDS_MAGIC = b'SNPD'
+PDS_VERSION = 1
+PDS_HEADER = struct.Struct('<4sIQQQQQ')     # magic, version, num_rows, row_size, data_offset, index_offset, index_size
+PDS_DATA_OFFSET = 4096
+
+class ParamDatasetWriter:
+    """ Writes a .pds file one row at a time, so a dataset never has to be held in memory.
+
+    Usage:
+        with ParamDatasetWriter('data.pds') as writer:
+            for name, params in ...:
+                writer.write(name, params)
+    """
+
+    def __init__ (self, path, row_size = None):
+        basedir = os.path.split(path)[0]
+        if basedir and not os.path.exists(basedir):
+            os.makedirs(basedir)
+        self.path = path
+        self.row_size = row_size
+        self.names = []
+        self.file = open(path, 'wb')
+        self.file.write(b'\0' * PDS_DATA_OFFSET)
+
+    def write (self, name, row):
+        """ appends a row (any flat sequence of floats), returning its index """
+        row = np.asarray(row, dtype='<f4').ravel()
+        if self.row_size is None:
+            self.row_size = row.size
+        elif row.size != self.row_size:
+            raise Exception("Row '%s' has %s values, expected %s!"%(name, row.size, self.row_size))
+        self.file.write(row.tobytes())
+        self.names.append(name)
+        return len(self.names) - 1
+
+    def close (self):
+        if self.file:
+            index = json.dumps(self.names).encode('utf-8')
+            index_offset = self.file.tell()
+            self.file.write(index)
+            self.file.seek(0)
+            self.file.write(PDS_HEADER.pack(PDS_MAGIC, PDS_VERSION,
+                len(self.names), self.row_size or 0,
+                PDS_DATA_OFFSET, index_offset, len(index)))
+            self.file.close()
+            self.file = None
+
+    def __enter__ (self):
+        return self
+
+    def __exit__ (self, *args):
+        self.close()
+
+
+class ParamDataset:
+    """ Read-only view of a .pds file. Rows are memory-mapped (zero copy), and can be
+    accessed by name (dataset[name]) or by index (dataset.array[i]).
+
+    Has the same keys() / values() / items() interface as the { name: params } dicts
+    written by read_obj.extract_params, except values() is an N x D float32 np.memmap.
+    """
+
+    def __init__ (self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(PDS_HEADER.size)
+            if len(header) < PDS_HEADER.size or header[:4] != PDS_MAGIC:
+                raise Exception("Not a param dataset: '%s'"%path)
+            magic, version, num_rows, row_size, data_offset, index_offset, index_size = PDS_HEADER.unpack(header)
+            if version != PDS_VERSION:
+                raise Exception("Unsupported param dataset version %s: '%s'"%(version, path))
+            f.seek(index_offset)
+            self.names = json.loads(f.read(index_size).decode('utf-8'))
+
+        self.index = { name: i for i, name in enumerate(self.names) }
+        if num_rows and row_size:
+            self.array = np.memmap(path, dtype='<f4', mode='r',
+                offset=data_offset, shape=(num_rows, row_size))
+        else:
+            self.array = np.zeros((num_rows, row_size), dtype='<f4')
+
+    def __len__ (self):
+        return len(self.names)
+
+    def __contains__ (self, name):
+        return name in self.index
+
+    def __getitem__ (self, name):
+        return self.array[self.index[name]]
+
+    def keys (self):
+        return list(self.names)
+
+    def values (self):
+        return self.array
+
+    def items (self):
+        return zip(self.names, self.array)
+
+
+def write_param_dataset (path, items):
+    """ writes (name, params) items (eg. dataset.items()) to a .pds file """
+    with ParamDatasetWriter(path) as writer:
+        for name, row in items:
+            writer.write(name, row)
+
+def convert_to_param_dataset (src_path, dst_path):
+    """ converts a { name: params } dataset (.pkl, .json, .json.zip, etc) to a .pds file """
+    data = deserialize_object(src_path)
+    print("Converting %s rows to '%s'..."%(len(data), dst_path))
+    t0 = time()
+    write_param_dataset(dst_path, data.items())
+    print("OK, converted in %s"%(time() - t0))
+
+
 if __name__ == '__main__':
+    import sys
+    if len(sys.argv) == 4 and sys.argv[1] == '--convert':
+        convert_to_param_dataset(sys.argv[2], sys.argv[3])
+        sys.exit()
+
+    if len(sys.argv) >= 3 and sys.argv[1] == '--benchmark':
+        benchmark_formats(deserialize_object(sys.argv[2]), [
+            '.json', '.json.gz', '.json.xz', '.json.bz2', '.json.zip',
+            '.pkl', '.pkl.gz', '.pkl.xz', '.pkl.bz2',
+        ], directory = os.path.split(sys.argv[2])[0], level = int(sys.argv[3]) if len(sys.argv) > 3 else None)
+        sys.exit()
+
     data = { 'foo': 1, 'bar': [1, 2] }
-    for ext in ('.json', '.pkl', '.json.zip', '.pkl.zip'):
+    for ext in ('.json', '.pkl', '.json.zip', '.pkl.zip', '.json.gz', '.pkl.xz', '.pkl.bz2'):
         path = 'foo/tempdir/foo' + ext
         serialize_object(path, data)
         read_data = deserialize_object(path)
         if data != read_data:
             raise Exception("%s != %s!"%(read_data, data))
 
+    params = { 'a': [ 0.0, 1.0, 2.0 ], 'b/c': [ 3.0, 4.0, 5.0 ] }
+    serialize_object('foo/tempdir/foo.pds', params)
+    read_params = deserialize_object('foo/tempdir/foo.pds')
+    if read_params.keys() != list(params.keys()) or read_params['b/c'].tolist() != params['b/c']:
+        raise Exception("%s != %s!"%(dict(read_params.items()), params))
+
+    array = np.arange(12, dtype=np.float32).reshape(3, 4)
+    for ext in ('.npy', '.npy.gz', '.pkl', '.pkl.xz'):
+        path = 'foo/tempdir/array' + ext
+        serialize_object(path, { 'array': array } if ext.startswith('.pkl') else array)
+        read_array = deserialize_object(path)
+        read_array = read_array['array'] if ext.startswith('.pkl') else read_array
+        if not np.array_equal(read_array, array):
+            raise Exception("%s != %s!"%(read_array, array))
+
     # os.rmdir('foo/tempdir')
     print("OK")
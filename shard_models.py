@@ -0,0 +1,197 @@
+import os
+import sys
+from time import time
+from serialization_utils import serialize_object, deserialize_object
+from zip_index import MEMBER_KINDS
+from extract_models import ShapenetZipArchive, get_matching_shapenet_model_ids, balance_by_size, extract_members, as_bytes
+
+#
+# Splits a taxonomy query into N shards (balanced by bytes) for extraction on multiple nodes:
+#
+#   plan:       writes <out-dir>/shards.json (the full query) + <out-dir>/shard-<i>-of-<n>.json (one per node)
+#   extract:    extracts one shard's models on a node, + writes <target-dir>/shard-<i>-of-<n>.done.json
+#   verify:     checks that a set of .done.json records covers the plan exactly once
+#
+
+SHARD_MANIFEST_VERSION = 1
+
+def shard_name (shard, num_shards):
+    return 'shard-%d-of-%d'%(shard, num_shards)
+
+def plan_shards (archive_path, num_shards, output_dir, matching_keywords, non_matching_keywords = None, kinds = None):
+    """ Splits every model matching a keyword query (see extract_models.get_matching_shapenet_model_ids)
+    into num_shards shards w/ ~equal compressed + extracted sizes (greedy largest-first, by model),
+    from the sizes in the archive's member index. Only counts files of the given kinds, if any.
+
+    Writes the plan to <output_dir>/shards.json and one manifest per shard, and returns the plan.
+    """
+    if kinds is not None:
+        unknown_kinds = set(kinds) - set(MEMBER_KINDS)
+        if unknown_kinds:
+            raise Exception("Unknown member kinds %s (expected one of %s)"%(sorted(unknown_kinds), MEMBER_KINDS))
+    with ShapenetZipArchive(archive_path) as archive:
+        synsets = get_matching_shapenet_model_ids(archive, matching_keywords, non_matching_keywords)
+        models = archive.load_member_index().model_totals(synsets, kinds)
+        signature = archive.signature()
+    if not models:
+        raise Exception("No models in '%s' match %s (excluding %s)"%(archive_path, matching_keywords, non_matching_keywords))
+
+    # balance by the sum of (relative) compressed + extracted sizes, so both end up ~even
+    total_compressed = max(sum(model['compressed_size'] for model in models), 1)
+    total_extracted = max(sum(model['extracted_size'] for model in models), 1)
+    for model in models:
+        model['weight'] = model['compressed_size'] / total_compressed + model['extracted_size'] / total_extracted
+
+    query = {
+        'matching_keywords': sorted(matching_keywords or []),
+        'non_matching_keywords': sorted(non_matching_keywords or []),
+        'kinds': sorted(kinds) if kinds is not None else None,
+    }
+    plan = {
+        'version': SHARD_MANIFEST_VERSION,
+        'archive': os.path.abspath(archive_path),
+        'signature': signature,
+        'query': query,
+        'num_shards': num_shards,
+        'models': sorted('%s/%s'%(model['synset'], model['model']) for model in models),
+        'shards': [],
+    }
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    for shard, shard_models in enumerate(balance_by_size(models, num_shards, 'weight', keep_empty=True)):
+        for model in shard_models:
+            del model['weight']
+        manifest = {
+            'version': SHARD_MANIFEST_VERSION,
+            'archive': plan['archive'],
+            'signature': signature,
+            'query': query,
+            'shard': shard,
+            'num_shards': num_shards,
+            'models': sorted(shard_models, key=lambda model: (model['synset'], model['model'])),
+            'num_files': sum(model['num_files'] for model in shard_models),
+            'compressed_size': sum(model['compressed_size'] for model in shard_models),
+            'extracted_size': sum(model['extracted_size'] for model in shard_models),
+        }
+        serialize_object(os.path.join(output_dir, shard_name(shard, num_shards) + '.json'), manifest, verbose=False)
+        plan['shards'].append({ key: manifest[key] for key in ('shard', 'num_files', 'compressed_size', 'extracted_size') })
+        print("%s: %s models, %s files (%s compressed, %s extracted)"%(
+            shard_name(shard, num_shards), len(shard_models), manifest['num_files'],
+            as_bytes(manifest['compressed_size']), as_bytes(manifest['extracted_size'])))
+
+    serialize_object(os.path.join(output_dir, 'shards.json'), plan, verbose=False)
+    return plan
+
+def extract_shard (manifest_path, target_dir, archive_path = None, num_workers = None):
+    """ Extracts the models in a shard manifest (see plan_shards) to target_dir, from the manifest's
+    archive (or archive_path, eg. a node-local copy of it), and records the result in
+    <target_dir>/shard-<i>-of-<n>.done.json (for verify_shards). Returns that record. """
+    manifest = deserialize_object(manifest_path, verbose=False)
+    archive_path = archive_path or manifest['archive']
+    t0 = time()
+    with ShapenetZipArchive(archive_path) as archive:
+        # (only compare sizes: node-local copies of the archive will have different mtimes)
+        if archive.signature()['size'] != manifest['signature']['size']:
+            raise Exception("'%s' doesn't match the archive '%s' was planned from"%(archive_path, manifest_path))
+        index = archive.load_member_index()
+        members, models = [], []
+        for model in manifest['models']:
+            model_members = index.members(model['synset'], model['model'], manifest['query']['kinds'])
+            if len(model_members) != model['num_files']:
+                raise Exception("Expected %s files for '%s/%s' in '%s', got %s"%(
+                    model['num_files'], model['synset'], model['model'], archive_path, len(model_members)))
+            members += model_members
+            models.append({
+                'synset': model['synset'], 'model': model['model'], 'num_files': len(model_members),
+                'extracted_size': sum(member['file_size'] for member in model_members),
+            })
+        print("Extracting %s (%s models)"%(shard_name(manifest['shard'], manifest['num_shards']), len(models)))
+        errors = extract_members(archive_path, members, target_dir, num_workers)
+
+    record = {
+        'version': SHARD_MANIFEST_VERSION,
+        'signature': manifest['signature'],
+        'query': manifest['query'],
+        'shard': manifest['shard'],
+        'num_shards': manifest['num_shards'],
+        'models': models,
+        'errors': errors,
+        'time': time() - t0,
+    }
+    serialize_object(os.path.join(target_dir, shard_name(manifest['shard'], manifest['num_shards']) + '.done.json'),
+        record, verbose=False)
+    return record
+
+def verify_shards (plan_path, record_paths):
+    """ Checks that a set of extract_shard records (.done.json) covers a plan (see plan_shards) exactly once:
+    every shard was extracted w/out errors, from the same archive + query, and every model in the plan was
+    extracted by exactly one shard. Prints any problems + returns True iff there are none. """
+    plan = deserialize_object(plan_path, verbose=False)
+    planned = set(plan['models'])
+    shards_by_model = {}
+    shards_seen = set()
+    problems = []
+
+    for path in record_paths:
+        record = deserialize_object(path, verbose=False)
+        name = shard_name(record['shard'], record['num_shards'])
+        if record['signature']['size'] != plan['signature']['size'] or record['query'] != plan['query'] or record['num_shards'] != plan['num_shards']:
+            problems.append("%s ('%s') is from a different plan"%(name, path))
+            continue
+        if record['shard'] in shards_seen:
+            problems.append("%s was given more than once ('%s')"%(name, path))
+            continue
+        shards_seen.add(record['shard'])
+        if record['errors']:
+            problems.append("%s had %s extraction errors"%(name, record['errors']))
+        for model in record['models']:
+            uuid = '%s/%s'%(model['synset'], model['model'])
+            shards_by_model.setdefault(uuid, []).append(name)
+
+    for shard in range(plan['num_shards']):
+        if shard not in shards_seen:
+            problems.append("%s is missing"%shard_name(shard, plan['num_shards']))
+    missing = planned - set(shards_by_model)
+    unexpected = set(shards_by_model) - planned
+    duplicated = { uuid: names for uuid, names in shards_by_model.items() if len(names) > 1 }
+    if missing:
+        problems.append("%s models were not extracted, eg. %s"%(len(missing), sorted(missing)[:5]))
+    if unexpected:
+        problems.append("%s models were extracted but not planned, eg. %s"%(len(unexpected), sorted(unexpected)[:5]))
+    for uuid, names in sorted(duplicated.items())[:20]:
+        problems.append("'%s' was extracted by %s"%(uuid, ', '.join(names)))
+
+    for problem in problems:
+        print("Error: %s"%problem)
+    if not problems:
+        print("OK: %s models extracted exactly once across %s shards"%(len(planned), plan['num_shards']))
+    return not problems
+
+def split_args (args, *options):
+    """ splits a list of args into (positional args, { option: [ args ] }), eg.
+    split_args([ 'a', '--kinds', 'obj' ], '--kinds') => ([ 'a' ], { '--kinds': [ 'obj' ] }) """
+    positional, values, current = [], {}, None
+    for arg in args:
+        if arg in options:
+            current = values.setdefault(arg, [])
+        elif current is not None:
+            current.append(arg)
+        else:
+            positional.append(arg)
+    return positional, values
+
+if __name__ == '__main__':
+    command, args = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else (None, [])
+    args, options = split_args(args, '--exclude', '--kinds', '--archive')
+    if command == 'plan' and len(args) >= 3:
+        plan_shards(args[0], int(args[1]), args[2], args[3:], options.get('--exclude'), options.get('--kinds'))
+    elif command == 'extract' and len(args) >= 2:
+        extract_shard(args[0], args[1],
+            archive_path = options['--archive'][0] if options.get('--archive') else None,
+            num_workers = int(args[2]) if len(args) > 2 else None)
+    elif command == 'verify' and len(args) >= 2:
+        sys.exit(0 if verify_shards(args[0], args[1:]) else 1)
+    else:
+        print("Usage: %s plan <shapenet-zip> <num-shards> <output-dir> [<keywords...>] [--exclude <keywords...>] [--kinds <member-kinds...>]"%sys.argv[0])
+        print("       %s extract <shard-manifest> <target-dir> [<num-workers>] [--archive <local-copy-of-shapenet-zip>]"%sys.argv[0])
+        print("       %s verify <output-dir>/shards.json <shard-done-records...>"%sys.argv[0])
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+
+# bpy-run-from-blender fix (see naive_shrinkwrap.py): blender workers are started as
+#   blender -b -P path/to/shrinkwrap_daemon.py --worker --backend=blender
+import sys
+import os
+if sys.argv[0].split('.exe')[0].endswith('blender') and sys.argv[1] == '-b' and sys.argv[2] == '-P':
+    origin_script_working_directory = os.path.split(sys.argv[3])[0]
+    print("setting working directory for imports: '%s'"%origin_script_working_directory)
+    sys.path.insert(0, origin_script_working_directory)
+    argv = sys.argv[3:]
+else:
+    argv = sys.argv
+
+# End header...
+import json
+import queue
+import atexit
+import shutil
+import threading
+import subprocess
+from collections import deque
+from time import time, sleep
+from run_bpy import blender_command, select_backend
+from serialization_utils import hash_file
+
+#
+# Persistent shrinkwrap workers: a pool of long-lived backend processes (blender, or plain python for the numpy
+# + stub backends), so backend startup is paid once per worker instead of once per model. Jobs + results are
+# sent over each worker's stdin / stdout, one json object per line:
+#
+#   parent => worker:   { 'id', 'import', 'export', 'subdivisions' }
+#   worker => parent:   PROTOCOL_PREFIX { 'type': 'ready', 'backend', 'pid' }
+#                       PROTOCOL_PREFIX { 'type': 'result', 'id', 'ok', 'error', 'time', 'output_size', 'source_hash' }
+#
+# Everything else a worker prints (eg. blender's own logging) is redirected to stderr. Workers exit once
+# their stdin is closed, ie. when the pool is closed or the parent process exits / is killed.
+# Exports are written to a temp file + renamed into place, so they're never left half written.
+#
+
+DAEMON_BACKENDS = ('blender', 'numpy', 'stub')
+PROTOCOL_PREFIX = '@@shrinkwrap-daemon@@ '
+
+# workers that exit on startup are restarted after START_BACKOFF, 2 * START_BACKOFF, ... seconds,
+# and retired after MAX_START_FAILURES failed starts in a row
+START_BACKOFF = 1.0
+MAX_START_FAILURES = 3
+
+#
+# Worker side
+#
+
+def stub_shrinkwrap (import_path, export_path, subdivisions):
+    """ test backend (no blender): copies the source .obj to export_path, then sleeps for
+    $SHRINKWRAP_STUB_DELAY seconds (so, like a real backend, a slow job that's killed leaves its export behind) """
+    if not os.path.exists(import_path):
+        raise Exception("No such file: '%s'"%import_path)
+    basedir = os.path.split(export_path)[0]
+    if basedir and not os.path.exists(basedir):
+        os.makedirs(basedir)
+    shutil.copyfile(import_path, export_path)
+    sleep(float(os.environ.get('SHRINKWRAP_STUB_DELAY') or 0))
+
+def partial_export_path (export_path, pid = None):
+    """ temp path an export is written to before it's complete (keeps the extension, for blender's exporter),
+    by the worker process pid (defaults to this one) """
+    base, ext = os.path.splitext(export_path)
+    return '%s.partial-%s%s'%(base, pid or os.getpid(), ext)
+
+def partial_export_pid (file):
+    """ returns the worker pid of a partial export's file name (see partial_export_path), or None """
+    base, partial, pid = os.path.splitext(file)[0].rpartition('.partial-')
+    return int(pid) if partial and pid.isdigit() else None
+
+def process_exists (pid):
+    """ true iff pid is a running process (always true where that can't be checked, ie. on windows) """
+    if os.name == 'nt':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def remove_partial_export (export_path, pid):
+    """ removes the partial export of a worker that was killed (or died) mid-export, if it left one """
+    path = partial_export_path(export_path, pid)
+    if os.path.exists(path):
+        print("Removing partial export '%s'"%path)
+        os.remove(path)
+
+def sweep_partial_exports (export_dir):
+    """ removes partial exports left in export_dir by workers that are no longer running (eg. from a pool
+    that was killed), skipping ones that may still be written to. Returns the # of files removed """
+    if not os.path.isdir(export_dir):
+        return 0
+    removed = 0
+    for file in os.listdir(export_dir):
+        pid = partial_export_pid(file)
+        if pid is not None and not process_exists(pid):
+            os.remove(os.path.join(export_dir, file))
+            removed += 1
+    if removed:
+        print("Removed %s stale partial exports from '%s'"%(removed, export_dir))
+    return removed
+
+def export_atomically (execute, import_path, export_path, subdivisions):
+    """ runs execute(import_path, <temp path>, subdivisions), then renames the result to export_path,
+    so export_path is either missing or complete, even if the backend fails or crashes mid-export """
+    partial_path = partial_export_path(export_path)
+    try:
+        execute(import_path, partial_path, subdivisions)
+        os.replace(partial_path, export_path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+def load_backend (backend):
+    """ returns execute_shrinkwrap(import_path, export_path, subdivisions) for a backend """
+    if backend == 'blender':
+        from naive_shrinkwrap import execute_shrinkwrap
+        return lambda import_path, export_path, subdivisions: execute_shrinkwrap(
+            import_path, export_path, subdivisions, 'blender')
+    if backend == 'numpy':
+        from numpy_shrinkwrap import execute_shrinkwrap
+        return execute_shrinkwrap
+    return stub_shrinkwrap
+
+def run_worker (backend):
+    """ worker main loop: runs jobs from stdin until it's closed """
+    protocol = os.fdopen(os.dup(1), 'w')
+    os.dup2(2, 1)
+
+    def send (message):
+        protocol.write(PROTOCOL_PREFIX + json.dumps(message) + '\n')
+        protocol.flush()
+
+    execute = load_backend(backend)
+    send({ 'type': 'ready', 'backend': backend, 'pid': os.getpid() })
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        job = json.loads(line)
+        t0 = time()
+        try:
+            export_atomically(execute, job['import'], job['export'], job['subdivisions'])
+            result = {
+                'ok': True, 'error': None, 'output_size': os.path.getsize(job['export']),
+                'source_hash': hash_file(job['import']),
+            }
+        except Exception as e:
+            result = { 'ok': False, 'error': '%s: %s'%(type(e).__name__, e), 'output_size': None, 'source_hash': None }
+        send(dict(result, type='result', id=job['id'], time=time() - t0))
+
+#
+# Parent side
+#
+
+def worker_command (backend):
+    script = os.path.abspath(__file__)
+    if backend == 'blender':
+        return blender_command(script, '--worker', '--backend=blender')
+    return [ sys.executable, script, '--worker', '--backend=%s'%backend ]
+
+class ShrinkwrapWorker:
+    """ One worker process. Its messages are put on a queue shared w/ the rest of its pool,
+    as (worker, process, message), followed by { 'type': 'exit', 'returncode' } when it exits. """
+
+    def __init__ (self, backend, worker_id, messages):
+        self.backend = backend
+        self.id = worker_id
+        self.messages = messages
+        self.process = None
+        self.job = None
+        self.ready = False
+        self.pid = None
+        self.timed_out = False
+        self.retiring = False
+        self.start_failures = 0
+        self.restart_at = None
+
+    def start (self):
+        self.job = None
+        self.ready = False
+        self.pid = None
+        self.timed_out = False
+        self.restart_at = None
+        self.started = time()
+        self.process = subprocess.Popen(worker_command(self.backend),
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True, bufsize=1)
+        threading.Thread(target=self.read_messages, args=(self.process,), daemon=True).start()
+
+    def read_messages (self, process):
+        for line in process.stdout:
+            before, prefix, message = line.partition(PROTOCOL_PREFIX)
+            if prefix:
+                self.messages.put((self, process, json.loads(message)))
+            elif line.strip():
+                sys.stderr.write(line)
+        process.wait()
+        self.messages.put((self, process, { 'type': 'exit', 'returncode': process.returncode }))
+
+    def submit (self, job):
+        """ sends job to the worker; returns False if it's already exited (its exit message restarts it) """
+        try:
+            self.process.stdin.write(json.dumps(job) + '\n')
+            self.process.stdin.flush()
+        except OSError:
+            self.ready = False
+            return False
+        self.job = dict(job, submitted=time())
+        return True
+
+    def stop (self, timeout = 30):
+        """ closes the worker's stdin (so it exits after its current job), killing it after timeout seconds """
+        process, self.process = self.process, None
+        if process is None:
+            return
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+class ShrinkwrapPool:
+    """ A pool of persistent shrinkwrap workers (see ShrinkwrapWorker), each running one job at a time.
+
+    Usage:
+        with ShrinkwrapPool('blender', num_workers=4) as pool:
+            for result in pool.run(jobs):
+                print(result['export'], result['ok'], result['time'])
+    """
+
+    def __init__ (self, backend = 'blender', num_workers = 1):
+        if backend not in DAEMON_BACKENDS:
+            raise Exception("Unknown shrinkwrap backend '%s' (expected one of %s)"%(backend, DAEMON_BACKENDS))
+        self.backend = backend
+        self.messages = queue.Queue()
+        self.workers = []
+        self.next_worker_id = 0
+        self.any_ready = False
+        self.swept_dirs = set()
+        self.resize(num_workers)
+        atexit.register(self.close)
+
+    def resize (self, num_workers):
+        """ changes the # of workers (while running, too): starts new workers, or retires workers
+        (idle ones immediately, busy ones once their current job is done) """
+        num_workers = max(1, num_workers)
+        active = [ worker for worker in self.workers if not worker.retiring ]
+        if active and num_workers != len(active):
+            print("Resizing pool: %s => %s workers"%(len(active), num_workers))
+        for worker in active[num_workers:]:
+            worker.retiring = True
+        for i in range(num_workers - len(active)):
+            worker = ShrinkwrapWorker(self.backend, self.next_worker_id, self.messages)
+            self.next_worker_id += 1
+            worker.start()
+            self.workers.append(worker)
+        self.stop_retired_workers()
+
+    def stop_retired_workers (self):
+        for worker in [ worker for worker in self.workers if worker.retiring and worker.job is None ]:
+            worker.stop()
+            self.workers.remove(worker)
+
+    def run (self, jobs, timeout = None, retries = 0, poll = None, poll_interval = 1.0):
+        """ Runs jobs ({ 'import', 'export', 'subdivisions' } + an optional 'id') from a shared queue, in order,
+        on whichever worker is idle next (so put the longest jobs first). Yields each job as it completes,
+        w/ its result:
+            ok, error:      whether the job succeeded, and why not
+            time:           time spent in the backend
+            wall_time:      time from submitting the job to receiving its result
+            output_size:    size of the export (if ok)
+            source_hash:    sha1 of the source .obj (if ok)
+            worker:         worker id
+            attempts:       # of times the job was run
+
+        Failed jobs are retried (at the back of the queue) up to retries times. Workers that exit mid-job
+        (eg. blender crashed) fail that job + are restarted; so are workers that take longer than timeout
+        seconds on a job. Jobs sent to a worker that had already exited go back to the front of the queue.
+        poll() (if given) is called every poll_interval seconds, eg. to resize the pool.
+
+        Partial exports (see partial_export_path) of workers that are killed or exit mid-job are removed
+        when that job fails, and stale ones (from workers that aren't running anymore) are swept from each
+        export directory the first time the pool runs a job there.
+        """
+        pending = deque(dict(job, id=job.get('id', i), attempts=0) for i, job in enumerate(jobs))
+        for export_dir in sorted(set(os.path.dirname(job['export']) or '.' for job in pending) - self.swept_dirs):
+            sweep_partial_exports(export_dir)
+            self.swept_dirs.add(export_dir)
+        running = 0
+        last_poll = time()
+        while pending or running:
+            for worker in self.workers:
+                if worker.process is None and worker.restart_at is not None and time() >= worker.restart_at:
+                    worker.start()
+                if pending and worker.ready and worker.job is None and not worker.retiring:
+                    job = pending.popleft()
+                    job['attempts'] += 1
+                    if worker.submit(job):
+                        running += 1
+                    else:
+                        print("Worker %s exited while idle, requeueing '%s'"%(worker.id, job['import']))
+                        job['attempts'] -= 1
+                        pending.appendleft(job)
+
+            if poll and time() - last_poll >= poll_interval:
+                last_poll = time()
+                poll()
+            if timeout is not None:
+                for worker in self.workers:
+                    if worker.job is not None and not worker.timed_out and time() - worker.job['submitted'] > timeout:
+                        print("Worker %s timed out after %ss on '%s'"%(worker.id, timeout, worker.job['import']))
+                        worker.timed_out = True
+                        worker.process.kill()
+
+            try:
+                worker, process, message = self.messages.get(timeout=poll_interval)
+            except queue.Empty:
+                continue
+            if process is not worker.process:
+                continue        # from a stopped / restarted process
+
+            if message['type'] == 'ready':
+                worker.ready = True
+                worker.pid = message['pid']
+                worker.start_failures = 0
+                self.any_ready = True
+                print("Worker %s ready (%s backend, pid %s, started in %0.2fs)"%(
+                    worker.id, message['backend'], message['pid'], time() - worker.started))
+                continue
+            if message['type'] == 'exit':
+                if worker.pid is None:
+                    self.handle_startup_failure(worker, message['returncode'])
+                    continue
+                job, timed_out, pid = worker.job, worker.timed_out, worker.pid
+                if not timed_out:
+                    print("Worker %s exited (exit code %s)"%(worker.id, message['returncode']))
+                if job is not None:
+                    remove_partial_export(job['export'], pid)
+                if worker.retiring:
+                    worker.process = None
+                    self.workers.remove(worker)
+                else:
+                    worker.start()
+                if job is None:
+                    continue
+                message = {
+                    'ok': False, 'time': time() - job['submitted'], 'output_size': None,
+                    'error': 'timed out after %ss'%timeout if timed_out else 'worker exited (exit code %s)'%message['returncode'],
+                }
+            else:
+                job, worker.job = worker.job, None
+
+            running -= 1
+            result = self.job_result(worker, job, message)
+            self.stop_retired_workers()
+            if not result['ok'] and result['attempts'] <= retries:
+                print("Retrying '%s' (attempt %s failed: %s)"%(result['import'], result['attempts'], result['error']))
+                pending.append({ key: value for key, value in job.items() if key != 'submitted' })
+                continue
+            yield result
+
+    def handle_startup_failure (self, worker, returncode):
+        """ a worker exited before it was ready: raises if no worker has ever started (ie. the backend's broken),
+        otherwise restarts the worker after a backoff, or retires it after MAX_START_FAILURES tries """
+        if not self.any_ready:
+            raise Exception("Worker %s exited on startup (exit code %s): %s"%(
+                worker.id, returncode, ' '.join(worker_command(self.backend))))
+        worker.process = None
+        worker.start_failures += 1
+        if worker.retiring or worker.start_failures >= MAX_START_FAILURES:
+            print("Worker %s exited on startup (exit code %s), %d times in a row: retiring it"%(
+                worker.id, returncode, worker.start_failures))
+            self.workers.remove(worker)
+            if not self.workers:
+                raise Exception("All workers failed to restart: %s"%' '.join(worker_command(self.backend)))
+        else:
+            delay = START_BACKOFF * 2 ** (worker.start_failures - 1)
+            print("Worker %s exited on startup (exit code %s), restarting in %0.1fs"%(worker.id, returncode, delay))
+            worker.restart_at = time() + delay
+
+    def job_result (self, worker, job, message):
+        result = { key: value for key, value in job.items() if key != 'submitted' }
+        result.update({
+            'ok': message['ok'], 'error': message['error'], 'time': message['time'],
+            'wall_time': time() - job['submitted'], 'output_size': message['output_size'], 'worker': worker.id,
+            'source_hash': message.get('source_hash'),
+        })
+        return result
+
+    def close (self):
+        for worker in self.workers:
+            job, pid = worker.job, worker.pid
+            worker.stop()
+            if job is not None:
+                remove_partial_export(job['export'], pid)
+        atexit.unregister(self.close)
+
+    def __enter__ (self):
+        return self
+
+    def __exit__ (self, *args):
+        self.close()
+
+
+def run_shrinkwrap_jobs (import_paths, export_dir, subdivisions, num_workers, backend):
+    """ shrinkwraps each .obj in import_paths to <export_dir>/<file name>, printing timings """
+    jobs = [
+        { 'import': os.path.abspath(path), 'export': os.path.abspath(os.path.join(export_dir, os.path.split(path)[1])),
+          'subdivisions': subdivisions }
+        for path in import_paths
+    ]
+    t0 = time()
+    results = []
+    with ShrinkwrapPool(backend, num_workers) as pool:
+        for result in pool.run(jobs):
+            results.append(result)
+            print("%d / %d: %s '%s' (worker %s, %0.2fs, %0.2fs w/ ipc)%s"%(
+                len(results), len(jobs), 'OK' if result['ok'] else 'FAILED', result['export'],
+                result['worker'], result['time'], result['wall_time'],
+                '' if result['ok'] else ': %s'%result['error']))
+    elapsed = time() - t0
+    print("Done: %d / %d ok in %0.2fs (%0.2f jobs / sec, %s workers)"%(
+        sum(result['ok'] for result in results), len(jobs), elapsed, len(jobs) / max(elapsed, 1e-9), num_workers))
+    return results
+
+if __name__ == '__main__':
+    backend, argv = select_backend(argv, backends=DAEMON_BACKENDS)
+    if len(argv) >= 2 and argv[1] == '--worker':
+        run_worker(backend)
+        sys.exit()
+
+    if len(argv) < 5:
+        print("Usage: %s <export-dir> <num-workers> <subdivision-levels> <import-paths>.obj... [--backend=blender|numpy|stub]"%argv[0])
+        sys.exit()
+    results = run_shrinkwrap_jobs(argv[4:], argv[1], int(argv[3]), int(argv[2]), backend)
+    sys.exit(0 if all(result['ok'] for result in results) else 1)
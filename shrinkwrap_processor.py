@@ -16,24 +16,96 @@ if sys.argv[0].split('.exe')[0].endswith('blender') and sys.argv[1] == '-b' and
 else:
     argv = sys.argv
 
-# re-run self from within blender if bpy not available.
-# lets you run this script directly, while really running it from within blender's python install.
+# this script doesn't need to re-run itself from within blender: tasks are run by persistent blender (or numpy)
+# worker processes, started by shrinkwrap_daemon. If it is run from within blender anyway (ie. blender -b -P
+# shrinkwrap_processor.py ...), every task runs in that blender process instead.
 # note: the code above is to fix imports (re-add the local working directory to the python search path)
 # when this happens
-from run_bpy import run_self
-run_self()
+from run_bpy import select_backend
+from shrinkwrap_daemon import ShrinkwrapPool, DAEMON_BACKENDS, export_atomically
+backend, argv = select_backend(argv, backends=DAEMON_BACKENDS)
 
 # End header...
-from naive_shrinkwrap import execute_shrinkwrap
 import json
-import multiprocessing
+from time import time
+from serialization_utils import hash_file
 
-def run_shrinkwrap_worker (task_bundle):
+JOURNAL_FILE = 'shrinkwrap-journal.jsonl'
+
+class CompletionJournal:
+    """ Append-only record of completed shrinkwrap tasks, one json line per task (flushed + synced as it's written):
+        { 'task', 'import', 'source_size', 'source_mtime', 'source_hash', 'export', 'output_size', 'duration', 'subdivisions' }
+
+    A task is complete (see is_complete) if it has an entry w/ the same subdivisions, its source .obj is unchanged
+    (same size + mtime) and its export has the recorded size. That only takes 2 stat calls per task, so
+    restarting an interrupted run skips its finished tasks immediately.
+    """
+
+    def __init__ (self, path):
+        self.path = path
+        self.root = os.path.split(os.path.abspath(path))[0]
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                text = f.read()
+            for line in text.splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue        # eg. the last line, if a crash cut it short
+                self.entries[entry['task']] = entry
+            if text and not text.endswith('\n'):
+                with open(path, 'a') as f:
+                    f.write('\n')
+        self.file = open(path, 'a')
+
+    def task_id (self, task):
+        return os.path.relpath(os.path.abspath(task['export']), self.root)
+
+    def is_complete (self, task, subdivisions):
+        entry = self.entries.get(self.task_id(task))
+        if entry is None or entry['subdivisions'] != subdivisions:
+            return False
+        try:
+            source, export = os.stat(task['import']), os.stat(task['export'])
+        except OSError:
+            return False
+        return (source.st_size == entry['source_size'] and source.st_mtime == entry['source_mtime']
+            and export.st_size == entry['output_size'])
+
+    def record (self, task, subdivisions, source_hash, output_size, duration):
+        stat = os.stat(task['import'])
+        entry = {
+            'task': self.task_id(task),
+            'import': task['import'], 'source_size': stat.st_size, 'source_mtime': stat.st_mtime, 'source_hash': source_hash,
+            'export': task['export'], 'output_size': output_size,
+            'duration': duration, 'subdivisions': subdivisions,
+        }
+        self.file.write(json.dumps(entry) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.entries[entry['task']] = entry
+
+    def close (self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def __enter__ (self):
+        return self
+
+    def __exit__ (self, *args):
+        self.close()
+
+def run_shrinkwrap_worker (task_bundle, journal):
+    """ runs a bundle of tasks in this process (ie. from within blender), skipping + recording completed tasks in journal """
+    from naive_shrinkwrap import execute_shrinkwrap
     print("STARTING WORKER %s (%s tasks)"%(
         task_bundle['worker'], len(task_bundle['tasks'])))
     for i, task in enumerate(task_bundle['tasks']):
-        if os.path.exists(task['export']):
-            print("Skipping %s, already exists"%task['export'])
+        if journal.is_complete(task, task_bundle['subdivisions']):
+            print("Skipping %s, already done"%task['export'])
+            continue
 
         print("Running worker %s, task %s: %s => %s"%(
             task_bundle['worker'], i, task['import'], task['export']
@@ -42,7 +114,11 @@ def run_shrinkwrap_worker (task_bundle):
         path = os.path.split(task['export'])[0]
         if not os.path.exists(path):
             os.makedirs(path)
-        execute_shrinkwrap(task['import'], task['export'], task_bundle['subdivisions'])
+        t0 = time()
+        export_atomically(lambda import_path, export_path, subdivisions: execute_shrinkwrap(
+            import_path, export_path, subdivisions, task_bundle.get('backend')),
+            task['import'], task['export'], task_bundle['subdivisions'])
+        journal.record(task, task_bundle['subdivisions'], hash_file(task['import']), os.path.getsize(task['export']), time() - t0)
 
 def generate_shapenet_tasks (shapenet_synsets_dir, output_dir):
     for synset_dir in os.listdir(shapenet_synsets_dir):
@@ -74,52 +150,127 @@ def load_shrinkwrap_tasks (task_json_file):
     with open(task_json_file, 'r') as f:
         return json.loads(f.read())
 
-def run_shrinkwrap_tasks (shapenet_synsets_dir, output_dir, subdivisions, num_workers, use_cached_tasks = False):
-    task_file = 'tasks-%s-%s.json'%(subdivisions, num_workers)
+def order_tasks_by_size (tasks):
+    """ sorts tasks by the size of their source .obj, largest first: big models take the longest to shrinkwrap,
+    so starting them first keeps one worker from straggling on them at the end of a run """
+    for task in tasks:
+        task['size'] = os.path.getsize(task['import']) if os.path.exists(task['import']) else 0
+    return sorted(tasks, key=lambda task: -task['size'])
+
+def worker_count_control (path, pool):
+    """ returns a ShrinkwrapPool.run poll() callback that resizes pool to the # of workers in a control file
+    (eg. echo 8 > <path>) whenever it changes """
+    state = { 'mtime': os.path.getmtime(path) if os.path.exists(path) else None }
+    def poll ():
+        if not os.path.exists(path) or os.path.getmtime(path) == state['mtime']:
+            return
+        state['mtime'] = os.path.getmtime(path)
+        try:
+            with open(path, 'r') as f:
+                num_workers = int(f.read().strip())
+        except ValueError:
+            print("Ignoring '%s': expected a # of workers"%path)
+            return
+        pool.resize(min(32, max(1, num_workers)))
+    return poll
+
+def pop_option (argv, name, default = None):
+    """ removes a --<name>=<value> argument from argv, returning (value, argv w/out it) """
+    value, args = default, []
+    for arg in argv:
+        if arg.startswith('--%s='%name):
+            value = arg[len('--%s='%name):]
+        else:
+            args.append(arg)
+    return value, args
+
+def run_shrinkwrap_tasks (shapenet_synsets_dir, output_dir, subdivisions, num_workers, use_cached_tasks = False, backend = None,
+        timeout = None, retries = 1):
+    """ Shrinkwraps every model in a shapenet synsets dir on a pool of workers (see shrinkwrap_daemon.ShrinkwrapPool),
+    from one shared queue, largest models first. Tasks that fail (or take longer than timeout seconds) are retried
+    up to retries times; tasks that still fail are written to <output_dir>/shrinkwrap-failures.json.
+
+    Completed tasks are recorded in <output_dir>/shrinkwrap-journal.jsonl (see CompletionJournal), and skipped
+    by later runs (so an interrupted run can just be restarted), as long as their source + export are unchanged.
+
+    The # of workers can be changed while running, by writing it to <output_dir>/.num-workers.
+    Returns the failed tasks.
+    """
+    task_file = 'tasks-%s.json'%subdivisions
     if use_cached_tasks and os.path.exists(task_file):
         tasks = load_shrinkwrap_tasks(task_file)
     else:
-        task_bundles = [ list() for i in range(num_workers) ]
-        task_items = list(generate_shapenet_tasks(shapenet_synsets_dir, output_dir))
-        for i, task in enumerate(task_items):
-            task_bundles[ i % num_workers ].append(task)
-
-        print("Total # tasks: %s"%len(task_items))
-        for i, bundle in enumerate(task_bundles):
-            print("%s: %s tasks"%(i, len(bundle)))
-
+        task_items = order_tasks_by_size(list(generate_shapenet_tasks(shapenet_synsets_dir, output_dir)))
+        print("Total # tasks: %s (%0.1f MB of .obj files)"%(
+            len(task_items), sum(task['size'] for task in task_items) / 1e6))
         tasks = {
             'num_tasks': len(task_items),
             'subdivisions': subdivisions,
-            'num_workers': num_workers,
-            'task_bundles': [
-                { 'worker': i, 'tasks': task_bundles[i], 'subdivisions': subdivisions }
-                for i in range(num_workers)
-            ]
+            'tasks': task_items,
         }
         save_shrinkwrap_tasks(task_file, tasks)
 
-    print("Running %s tasks on %s workers"%(
-        tasks['num_tasks'], tasks['num_workers']
-    ))
-    if num_workers > 1:
-        pool = multiprocessing.Pool(num_workers)
-        pool.map(run_shrinkwrap_worker, tasks['task_bundles'])
-        # map(run_shrinkwrap_worker, tasks['task_bundles'])
-    else:
-        run_shrinkwrap_worker(tasks['task_bundles'][0])
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    journal = CompletionJournal(os.path.join(output_dir, JOURNAL_FILE))
+
+    if sys.argv[0].split('.exe')[0].endswith('blender'):
+        print("Running %s tasks from within blender"%tasks['num_tasks'])
+        with journal:
+            run_shrinkwrap_worker({ 'worker': 0, 'tasks': tasks['tasks'], 'subdivisions': tasks['subdivisions'], 'backend': backend }, journal)
+        return []
+
+    jobs = [ dict(task, subdivisions=tasks['subdivisions']) for task in tasks['tasks']
+        if not journal.is_complete(task, tasks['subdivisions']) ]
+    if len(jobs) < tasks['num_tasks']:
+        print("Skipping %s / %s tasks, already done (see '%s')"%(tasks['num_tasks'] - len(jobs), tasks['num_tasks'], journal.path))
+    if not jobs:
+        journal.close()
+        print("Nothing to do: all %s tasks are done"%tasks['num_tasks'])
+        return []
+
+    control_path = os.path.join(output_dir, '.num-workers')
+    with open(control_path, 'w') as f:
+        f.write('%s\n'%num_workers)
+    print("Running %s tasks on %s workers (%s backend, timeout %s, %s retries); to change the # of workers, write it to '%s'"%(
+        len(jobs), num_workers, backend or 'blender', '%ss'%timeout if timeout else 'none', retries, control_path))
+
+    t0 = time()
+    failures = []
+    with journal, ShrinkwrapPool(backend or 'blender', num_workers) as pool:
+        for i, result in enumerate(pool.run(jobs, timeout, retries, worker_count_control(control_path, pool))):
+            if result['ok']:
+                journal.record(result, tasks['subdivisions'], result['source_hash'], result['output_size'], result['time'])
+            else:
+                failures.append({ key: result[key] for key in ('import', 'export', 'size', 'error', 'attempts') })
+                print("Failed: %s => %s: %s"%(result['import'], result['export'], result['error']))
+            print("Done: %d / %d (%d failed), worker %s: %s (%0.1f MB, %0.2fs)"%(
+                i + 1, len(jobs), len(failures), result['worker'], result['export'], result['size'] / 1e6, result['time']))
+
+    report_path = os.path.join(output_dir, 'shrinkwrap-failures.json')
+    with open(report_path, 'w') as f:
+        f.write(json.dumps(failures, indent=2))
+    print("Finished %d tasks (%d failed) in %0.2fs"%(len(jobs), len(failures), time() - t0))
+    if failures:
+        print("Failed tasks written to '%s'"%report_path)
+    return failures
 
 if __name__ == '__main__':
     SUBDIVISION_LEVELS = 2
     NUM_WORKERS = 4
 
+    timeout, argv = pop_option(argv, 'timeout')
+    retries, argv = pop_option(argv, 'retries', 1)
     if len(argv) < 2:
-        print("Usage: %s <path/to/shapenet/dir> [<export-path>] [<worker-threads>] [<subdivision-levels>]"%argv[0])
+        print("Usage: %s <path/to/shapenet/dir> [<export-path>] [<worker-threads>] [<subdivision-levels>] [--backend=blender|numpy|stub] [--timeout=<seconds>] [--retries=<n>]"%argv[0])
         # sys.exit(-1)
     else:
         run_shrinkwrap_tasks(
             argv[1],
             'shrinkwrap-exports' if len(argv) < 3 else argv[2],
             SUBDIVISION_LEVELS if len(argv) < 5 else min(6, max(0, int(argv[4]))),
-            NUM_WORKERS if len(argv) < 4 else min(32, max(1, int(argv[3])))
+            NUM_WORKERS if len(argv) < 4 else min(32, max(1, int(argv[3]))),
+            backend = backend,
+            timeout = float(timeout) if timeout else None,
+            retries = int(retries),
         )
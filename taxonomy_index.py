@@ -0,0 +1,146 @@
+import os
+import json
+from time import time
+from serialization_utils import serialize_object, deserialize_object
+
+#
+# Precomputed shapenet taxonomy (taxonomy.json) queries
+#
+
+TAXONOMY_INDEX_VERSION = 1
+
+def parse_keywords (name):
+    """ returns the set of (non-empty) keywords in a taxonomy item name, eg. 'car,auto' => { 'car', 'auto' } """
+    return set(kw.strip() for kw in name.split(',') if kw.strip() != '')
+
+
+class TaxonomyIndex:
+    """ Taxonomy lookup tables, built once from taxonomy.json (+ optional per-synset archive totals):
+        names:              { synsetId: name }
+        children:           { synsetId: [ child synsetIds ] }
+        keywords:           { synsetId: set of keywords (see parse_keywords) }
+        synsets_by_keyword: { keyword: set of synsetIds }  (inverted keyword index)
+        descendants:        { synsetId: set of all (transitive) child synsetIds }
+        totals:             { synsetId: [ # models, compressed bytes, extracted bytes ] }
+
+    Usage:
+        index = TaxonomyIndex.from_taxonomy(json.load(f), totals)
+        result = index.query([ 'car' ], [ 'jeep' ])
+        print(result['synsets'], result['num_models'], result['extracted_size'])
+    """
+
+    def __init__ (self, names, children, totals = None):
+        self.names = names
+        self.children = { synset: [ child for child in children.get(synset, []) if child in names ] for synset in names }
+        self.totals = totals or {}
+        self.keywords = { synset: parse_keywords(name) for synset, name in names.items() }
+        self.synsets_by_keyword = {}
+        for synset, keywords in self.keywords.items():
+            for keyword in keywords:
+                self.synsets_by_keyword.setdefault(keyword, set()).add(synset)
+
+        self.descendants = {}
+        def descendants (synset, visiting):
+            if synset not in self.descendants:
+                result = set()
+                for child in self.children[synset]:
+                    if child not in visiting:
+                        result.add(child)
+                        result |= descendants(child, visiting | { synset })
+                self.descendants[synset] = result
+            return self.descendants[synset]
+        for synset in names:
+            descendants(synset, set())
+
+    @classmethod
+    def from_taxonomy (cls, taxonomy, totals = None):
+        """ builds an index from the (parsed) contents of taxonomy.json """
+        return cls(
+            { item['synsetId']: item['name'] for item in taxonomy },
+            { item['synsetId']: item['children'] for item in taxonomy },
+            totals)
+
+    def save (self, path, signature):
+        serialize_object(path, {
+            'version': TAXONOMY_INDEX_VERSION,
+            'signature': signature,
+            'names': self.names,
+            'children': self.children,
+            'totals': self.totals,
+        }, verbose=False)
+
+    @classmethod
+    def load (cls, path, signature):
+        """ loads an index saved w/ the same signature, or returns None """
+        if not os.path.exists(path):
+            return None
+        try:
+            data = deserialize_object(path, verbose=False)
+        except ValueError:
+            return None
+        if data.get('version') != TAXONOMY_INDEX_VERSION or data.get('signature') != signature:
+            return None
+        return cls(data['names'], data['children'], data['totals'])
+
+    def query (self, matching_keywords, non_matching_keywords = None):
+        """ Returns all synsets matching a keyword query (same semantics as keyword_list_match):
+        synsets w/ any of matching_keywords (or all synsets, if empty) + all of their descendants,
+        except for synsets w/ any of non_matching_keywords (or w/out a name), whose subtrees are pruned.
+
+        Returns { 'synsets': [ synsetIds ], 'num_models', 'compressed_size', 'extracted_size' }
+        (totals are 0 if the index was built w/out them)
+        """
+        matching_keywords = set(matching_keywords or [])
+        non_matching_keywords = set(non_matching_keywords or [])
+
+        excluded = set(synset for synset, keywords in self.keywords.items() if not keywords)
+        for keyword in non_matching_keywords:
+            excluded |= self.synsets_by_keyword.get(keyword, set())
+
+        if matching_keywords:
+            seeds = set()
+            for keyword in matching_keywords:
+                seeds |= self.synsets_by_keyword.get(keyword, set())
+        else:
+            seeds = set(self.names)
+
+        selected = set()
+        for seed in seeds - excluded:
+            if seed in selected:
+                continue
+            if not self.descendants[seed] & excluded:
+                selected.add(seed)
+                selected |= self.descendants[seed]
+                continue
+            # excluded descendants: walk the subtree, pruning excluded synsets
+            stack = [ seed ]
+            while stack:
+                synset = stack.pop()
+                if synset not in selected and synset not in excluded:
+                    selected.add(synset)
+                    stack += self.children[synset]
+
+        totals = [ self.totals.get(synset, [ 0, 0, 0 ]) for synset in selected ]
+        return {
+            'synsets': sorted(selected),
+            'num_models':       sum(total[0] for total in totals),
+            'compressed_size':  sum(total[1] for total in totals),
+            'extracted_size':   sum(total[2] for total in totals),
+        }
+
+
+def load_taxonomy_index (shapenet_archive):
+    """ loads the TaxonomyIndex for a shapenet archive (see extract_models.load_shapenet_archive)
+    from <archive path>.taxonomy-index.json, or builds + saves it if it's missing or out of date """
+    path = shapenet_archive.path.rstrip('/\\') + '.taxonomy-index.json'
+    signature = shapenet_archive.signature()
+    index = TaxonomyIndex.load(path, signature)
+    if index is None:
+        print("Building taxonomy index '%s'..."%path)
+        t0 = time()
+        with shapenet_archive.open('taxonomy.json', 'r') as f:
+            taxonomy = json.loads(f.read())
+        index = TaxonomyIndex.from_taxonomy(taxonomy, shapenet_archive.synset_totals())
+        index.save(path, signature)
+        print("Built in %s"%(time() - t0))
+    return index
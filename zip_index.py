@@ -0,0 +1,388 @@
+import os
+import io
+import zlib
+import mmap
+import struct
+import sqlite3
+import zipfile
+from time import time
+
+#
+# Persistent sqlite index of a (shapenet) zip archive's members.
+#
+# Stores everything needed to find + read a member w/out parsing the zip central directory:
+# its synset / model / kind (see classify_member), local header offset, sizes, crc + compression type.
+#
+
+ZIP_INDEX_VERSION = 1
+
+ZIP_INDEX_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    CREATE TABLE IF NOT EXISTS members (
+        path            TEXT PRIMARY KEY,
+        synset          TEXT,
+        model           TEXT,
+        kind            TEXT,
+        header_offset   INTEGER,
+        compress_size   INTEGER,
+        file_size       INTEGER,
+        crc             INTEGER,
+        compress_type   INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS members_by_model ON members (synset, model);
+    CREATE INDEX IF NOT EXISTS members_by_kind ON members (kind);
+'''
+
+MEMBER_KINDS = ('obj', 'mtl', 'textures', 'solid.binvox', 'surface.binvox', 'info', 'other')
+
+def classify_member (path):
+    """ returns (synsetId, modelId, kind) for a path in a shapenet archive, where kind is one of
+    MEMBER_KINDS (same categories as ShapenetZipArchive.build_file_index), or 'dir' for directories.
+    Paths outside of a model directory (eg. 'ShapeNetCore.v2/taxonomy.json') return (None, None, 'other')
+    """
+    parts = path.split('/')
+    if len(parts) < 3:
+        return None, None, 'dir' if path.endswith('/') else 'other'
+    rootdir, synsetId, model = parts[:3]
+    file = '/'.join(parts[3:])
+    ext = '.'.join(file.split('.')[1:])
+    if not file or file.endswith('/'):
+        kind = 'dir'
+    elif ext in ('obj', 'mtl', 'solid.binvox', 'surface.binvox'):
+        kind = ext
+    elif ext == 'json':
+        kind = 'info'
+    elif file.startswith('texture') and ext == 'jpg':
+        kind = 'textures'
+    else:
+        kind = 'other'
+    return synsetId, model, kind
+
+
+class ZipMemberIndex:
+    """ sqlite member index for a zip archive, stored next to it (at <archive>.index.sqlite by default).
+
+    Usage:
+        index = ZipMemberIndex('ShapeNetCore.v2.zip')
+        if not index.is_current():
+            index.build()
+        for member in index.members(synset = '02958343', kinds = [ 'obj' ]):
+            with index.open_member(member['path']) as f:
+                ...
+    """
+
+    def __init__ (self, archive_path, index_path = None):
+        self.archive_path = archive_path
+        self.index_path = index_path or archive_path + '.index.sqlite'
+        self.db = None
+        self.mapping = ZipArchiveMap(archive_path)
+
+    def connect (self):
+        if self.db is None:
+            self.db = sqlite3.connect(self.index_path)
+            self.db.row_factory = sqlite3.Row
+            self.db.executescript(ZIP_INDEX_SCHEMA)
+        return self.db
+
+    def close (self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+        self.mapping.close()
+
+    def archive_signature (self):
+        stat = os.stat(self.archive_path)
+        return { 'version': str(ZIP_INDEX_VERSION), 'size': str(stat.st_size), 'mtime': str(stat.st_mtime_ns) }
+
+    def is_current (self):
+        """ true iff the index exists + was built from the current version of the archive """
+        if not os.path.exists(self.index_path):
+            return False
+        meta = dict(self.connect().execute('SELECT key, value FROM meta').fetchall())
+        return all(meta.get(key) == value for key, value in self.archive_signature().items())
+
+    def build (self, infolist = None):
+        """ (re)builds the index from the archive's central directory (or a ZipFile.infolist()) """
+        print("Building member index '%s'..."%self.index_path)
+        t0 = time()
+        if infolist is None:
+            with zipfile.ZipFile(self.archive_path, 'r') as archive:
+                infolist = archive.infolist()
+
+        db = self.connect()
+        with db:
+            db.execute('DELETE FROM members')
+            db.execute('DELETE FROM meta')
+            db.executemany('INSERT INTO members VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+                (info.filename,) + classify_member(info.filename) + (
+                    info.header_offset, info.compress_size, info.file_size, info.CRC, info.compress_type)
+                for info in infolist
+            ))
+            db.executemany('INSERT INTO meta VALUES (?, ?)', self.archive_signature().items())
+        print("Indexed %s members in %s"%(len(infolist), time() - t0))
+
+    #
+    # Queries
+    #
+
+    def member (self, path):
+        """ returns the index row for path (dict-like: path, synset, model, kind, header_offset, ...), or None """
+        return self.connect().execute('SELECT * FROM members WHERE path = ?', (path,)).fetchone()
+
+    def members (self, synset = None, model = None, kinds = None):
+        """ returns the index rows for all files (not directories) in a synset / model, optionally
+        restricted to a set of member kinds (see MEMBER_KINDS) """
+        query, args = [ "kind != 'dir'" ], []
+        if synset is not None:
+            query.append('synset = ?')
+            args.append(synset)
+        if model is not None:
+            query.append('model = ?')
+            args.append(model)
+        if kinds is not None:
+            kinds = list(kinds)
+            query.append('kind IN (%s)'%', '.join('?' * len(kinds)))
+            args += kinds
+        return self.connect().execute('SELECT * FROM members WHERE %s ORDER BY path'%(
+            ' AND '.join(query)), args).fetchall()
+
+    def prefix_query (self, prefix, kinds = None):
+        """ WHERE clause + args matching all members whose path starts w/ prefix (as a range scan
+        over the sorted path index, so it's O(log n) to find the first match) """
+        query, args = [ 'path >= ?' ], [ prefix ]
+        if prefix:
+            query.append('path < ?')
+            args.append(prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        if kinds is not None:
+            kinds = list(kinds)
+            query.append('kind IN (%s)'%', '.join('?' * len(kinds)))
+            args += kinds
+        return ' AND '.join(query), args
+
+    def members_with_prefix (self, prefix, kinds = None):
+        """ returns the index rows of all members (incl. directories, unless filtered by kinds)
+        whose path starts w/ prefix, in path order """
+        query, args = self.prefix_query(prefix, kinds)
+        return self.connect().execute('SELECT * FROM members WHERE %s ORDER BY path'%query, args).fetchall()
+
+    def prefix_totals (self, prefix, kinds = None):
+        """ returns (# members, total compressed size, total extracted size) for a path prefix """
+        query, args = self.prefix_query(prefix, kinds)
+        count, compress_size, file_size = self.connect().execute(
+            'SELECT COUNT(*), SUM(compress_size), SUM(file_size) FROM members WHERE %s'%query, args).fetchone()
+        return count, compress_size or 0, file_size or 0
+
+    def synset_totals (self):
+        """ returns { synsetId: [ # models, compressed bytes, extracted bytes ] } """
+        return { row[0]: list(row[1:]) for row in self.connect().execute(
+            "SELECT synset, COUNT(DISTINCT model), SUM(compress_size), SUM(file_size) FROM members "
+            "WHERE synset IS NOT NULL AND kind != 'dir' GROUP BY synset") }
+
+    def model_totals (self, synsets = None, kinds = None):
+        """ returns [ { 'synset', 'model', 'num_files', 'compressed_size', 'extracted_size' } ] for every
+        model in synsets (or the whole archive), counting only files of the given kinds (if any) """
+        query, args = [ "kind != 'dir'", 'model IS NOT NULL' ], []
+        if synsets is not None:
+            synsets = list(synsets)
+            query.append('synset IN (%s)'%', '.join('?' * len(synsets)))
+            args += synsets
+        if kinds is not None:
+            kinds = list(kinds)
+            query.append('kind IN (%s)'%', '.join('?' * len(kinds)))
+            args += kinds
+        return [
+            { 'synset': row[0], 'model': row[1], 'num_files': row[2], 'compressed_size': row[3], 'extracted_size': row[4] }
+            for row in self.connect().execute(
+                'SELECT synset, model, COUNT(*), SUM(compress_size), SUM(file_size) FROM members WHERE %s '
+                'GROUP BY synset, model ORDER BY synset, model'%' AND '.join(query), args)
+        ]
+
+    def synset_ids (self):
+        return [ row[0] for row in self.connect().execute(
+            'SELECT DISTINCT synset FROM members WHERE synset IS NOT NULL ORDER BY synset') ]
+
+    def load_synsets_and_models (self):
+        """ returns (synsets, models) in the same format as ShapenetZipArchive.build_file_index """
+        synsets, models = {}, {}
+        for row in self.connect().execute(
+                'SELECT path, synset, model, kind FROM members WHERE synset IS NOT NULL ORDER BY path'):
+            synsets.setdefault(row['synset'], set()).add(row['model'])
+            uuid = row['synset'] + '/' + row['model']
+            if uuid not in models:
+                models[uuid] = {
+                    'synsetId': row['synset'],
+                    'info': None, 'obj': None, 'mtl': None, 'textures': [],
+                    'solid.binvox': None, 'surface.binvox': None, 'other': [],
+                }
+            item, kind = models[uuid], row['kind']
+            if kind in ('textures', 'other'):
+                item[kind].append(row['path'])
+            elif kind != 'dir':
+                item[kind] = row['path']
+        synsets = { key: sorted(values) for key, values in synsets.items() }
+        return synsets, models
+
+    #
+    # Member reads (w/out loading the central directory), through a memory map of the archive
+    #
+
+    def lookup (self, path):
+        member = self.member(path)
+        if member is None:
+            raise KeyError("There is no item named '%s' in the archive"%path)
+        return member
+
+    def open_member (self, path):
+        """ opens a member for reading, directly from its local header offset """
+        return self.mapping.open(self.lookup(path))
+
+    def read_member (self, path):
+        """ returns a member's contents (see ZipArchiveMap.read) """
+        return self.mapping.read(self.lookup(path))
+
+
+ZIP_LOCAL_HEADER = struct.Struct('<4s5H3I2H')
+ZIP_LOCAL_HEADER_MAGIC = b'PK\x03\x04'
+
+def member_data_offset (f, header_offset):
+    """ returns the offset of a member's data, given its local header offset """
+    f.seek(header_offset)
+    header = ZIP_LOCAL_HEADER.unpack(f.read(ZIP_LOCAL_HEADER.size))
+    if header[0] != ZIP_LOCAL_HEADER_MAGIC:
+        raise Exception("Bad zip local header at offset %s"%header_offset)
+    name_size, extra_size = header[-2], header[-1]
+    return header_offset + ZIP_LOCAL_HEADER.size + name_size + extra_size
+
+class ZipMemberReader (io.RawIOBase):
+    """ reads (+ inflates) one zip member from an open archive file, starting at its data offset """
+
+    def __init__ (self, f, data_offset, member, close_file = True):
+        if member['compress_type'] not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise Exception("Unsupported compression type %s for '%s'"%(member['compress_type'], member['path']))
+        self.f = f
+        self.name = member['path']
+        self.close_file = close_file
+        self.offset = data_offset
+        self.remaining = member['compress_size']
+        self.inflate = zlib.decompressobj(-15) if member['compress_type'] == zipfile.ZIP_DEFLATED else None
+        self.pending, self.position = b'', 0
+
+    def readable (self):
+        return True
+
+    def read_raw (self, size):
+        self.f.seek(self.offset)
+        return self.f.read(size)
+
+    def next_chunk (self):
+        """ returns the next block of member data (inflated if needed), or b'' at the end of the member """
+        if not self.remaining:
+            if self.inflate:
+                chunk, self.inflate = self.inflate.flush(), None
+                return chunk
+            return b''
+        chunk = self.read_raw(min(self.remaining, 1 << 16))
+        if not chunk:
+            raise EOFError("Unexpected end of archive (%s bytes left in member)"%self.remaining)
+        self.offset += len(chunk)
+        self.remaining -= len(chunk)
+        return self.inflate.decompress(chunk) if self.inflate else chunk
+
+    def readinto (self, buffer):
+        while self.position >= len(self.pending):
+            if not self.remaining and not self.inflate:
+                return 0
+            self.pending, self.position = self.next_chunk(), 0
+        count = min(len(buffer), len(self.pending) - self.position)
+        buffer[:count] = self.pending[self.position:self.position + count]
+        self.position += count
+        return count
+
+    def close (self):
+        if self.close_file and not self.closed:
+            self.f.close()
+        super().close()
+
+def open_member_at (archive_path, member):
+    """ opens a member of archive_path (given its index row) as a buffered binary stream """
+    f = open(archive_path, 'rb')
+    try:
+        data_offset = member_data_offset(f, member['header_offset'])
+    except Exception:
+        f.close()
+        raise
+    return io.BufferedReader(ZipMemberReader(f, data_offset, member))
+
+
+class MappedMemberReader (ZipMemberReader):
+    """ ZipMemberReader over a (memoryview of a) member's raw data, see ZipArchiveMap.open """
+
+    def __init__ (self, data, member):
+        super().__init__(None, 0, member, close_file=False)
+        self.data = data
+
+    def read_raw (self, size):
+        return self.data[self.offset:self.offset + size]
+
+class ZipArchiveMap:
+    """ Read-only memory map of a zip archive, for reading members (index rows, see ZipMemberIndex)
+    straight from their local header offsets: no central directory, seeks or per-member file handles.
+
+    Stored members are returned as zero-copy memoryviews into the mapping; deflated members are
+    inflated (in chunks, if opened as streams). Every process that maps the archive shares the same
+    page cache; forked processes re-map the archive on first use.
+    """
+
+    def __init__ (self, archive_path):
+        self.archive_path = archive_path
+        self.file = self.buffer = None
+        self.pid = None
+
+    def map (self):
+        if self.buffer is None or self.pid != os.getpid():
+            self.file = open(self.archive_path, 'rb')
+            self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.pid = os.getpid()
+        return self.buffer
+
+    def close (self):
+        if self.buffer is not None and self.pid == os.getpid():
+            try:
+                self.buffer.close()
+            except BufferError:
+                pass    # member views are still in use: the mapping is released once they're gone
+            self.file.close()
+        self.file = self.buffer = None
+
+    def member_view (self, member):
+        """ returns a zero-copy memoryview of a member's raw (compressed) data """
+        buffer = self.map()
+        header = ZIP_LOCAL_HEADER.unpack_from(buffer, member['header_offset'])
+        if header[0] != ZIP_LOCAL_HEADER_MAGIC:
+            raise Exception("Bad zip local header at offset %s"%member['header_offset'])
+        start = member['header_offset'] + ZIP_LOCAL_HEADER.size + header[-2] + header[-1]
+        if start + member['compress_size'] > len(buffer):
+            raise EOFError("Unexpected end of archive reading '%s'"%member['path'])
+        return memoryview(buffer)[start:start + member['compress_size']]
+
+    def read (self, member):
+        """ returns a member's contents: a read-only memoryview into the mapping for stored members,
+        or bytes for deflated members """
+        data = self.member_view(member)
+        if member['compress_type'] == zipfile.ZIP_STORED:
+            return data
+        if member['compress_type'] == zipfile.ZIP_DEFLATED:
+            return zlib.decompress(data, -15, max(member['file_size'], 1))
+        raise Exception("Unsupported compression type %s for '%s'"%(member['compress_type'], member['path']))
+
+    def open (self, member):
+        """ opens a member as a buffered binary stream (inflated in chunks while it's read) """
+        return io.BufferedReader(MappedMemberReader(self.member_view(member), member))
+
+ARCHIVE_MAPS = {}
+
+def archive_map (archive_path):
+    """ returns a (per process) shared ZipArchiveMap for archive_path """
+    if archive_path not in ARCHIVE_MAPS:
+        ARCHIVE_MAPS[archive_path] = ZipArchiveMap(archive_path)
+    return ARCHIVE_MAPS[archive_path]